@@ -0,0 +1,292 @@
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+
+from headless import game
+
+# Actions are INPUT_KEYS bit masks, the same ints replays store
+LEFT, RIGHT, JUMP = (1 << game.INPUT_KEYS.index(key) for key in (game.pygame.K_LEFT, game.pygame.K_RIGHT, game.pygame.K_SPACE))
+OBSERVATION_FIELDS = ("x", "y", "velocity_y", "jumping", "health", "lives", "invincibility", "exit_dx", "exit_dy", "enemy_dx", "enemy_dy")
+CLEAR_REWARD = 1000  # On top of the score gained, for touching the exit
+DEATH_PENALTY = 500  # For every life lost
+ENEMY_SIZE = 30
+PU_SIZE = 20
+
+def overlaps(left, top, width, height, other_left, other_top, other_width, other_height):
+    """pygame.Rect.colliderect over broadcast arrays of non-empty rects"""
+    return (left < other_left + other_width) & (top < other_top + other_height) & (left + width > other_left) & (top + height > other_top)
+
+class BatchLevelEnv:
+    """N copies of one non-boss level stepped in lockstep with NumPy, following GameWorld.step tick for tick.
+
+    Every copy shares the level's platforms and spawn points; per copy state is
+    one row in each array. A copy that clears the level or runs out of lives is
+    done and stays frozen until reset() puts it back at the start.
+    """
+    def __init__(self, node_id=0, envs=1024, level_screens=1):
+        node = game.overworld_nodes[node_id]
+        if node["is_boss"]:
+            raise ValueError(f"{node['level']} is a boss fight; only walking levels are batched")
+        layout = game.level_for_node(node, level_screens)
+        self.n = envs
+        self.width = layout.width
+        self.start_y = game.get_start_y(layout.platforms)
+        platforms = layout.platforms
+        self.p_left = np.array([p.left for p in platforms], dtype=np.int64)
+        self.p_top = np.array([p.top for p in platforms], dtype=np.int64)
+        self.p_width = np.array([p.width for p in platforms], dtype=np.int64)
+        self.p_height = np.array([p.height for p in platforms], dtype=np.int64)
+        self.p_solid = np.array([not game.is_hazard(p) for p in platforms], dtype=bool)
+        self.p_hazard = ~self.p_solid
+        self.exit = game.pygame.Rect(layout.exit_pos, game.EXIT_SIZE) if layout.exit_pos else None
+
+        spawned = [game.Enemy(x, y, platform) for x, y, platform in layout.enemy_spawns]
+        self.e_start_x = np.array([enemy.rect.x for enemy in spawned], dtype=np.int64)
+        self.e_y = np.array([enemy.rect.y for enemy in spawned], dtype=np.int64)
+        self.e_speed = np.array([enemy.speed for enemy in spawned], dtype=np.int64)
+        self.e_start_direction = np.array([enemy.direction for enemy in spawned], dtype=np.int64)
+        self.e_left = np.array([enemy.platform.left for enemy in spawned], dtype=np.int64)
+        self.e_right = np.array([enemy.platform.right for enemy in spawned], dtype=np.int64)
+        self.pu_x = np.array([x for x, y in layout.power_up_spawns], dtype=np.int64)
+        self.pu_y = np.array([y for x, y in layout.power_up_spawns], dtype=np.int64)
+
+        n, e, u = envs, len(spawned), len(self.pu_x)
+        self.x = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n)
+        self.velocity_y = np.zeros(n)
+        self.jumping = np.zeros(n, dtype=bool)
+        self.health = np.zeros(n, dtype=np.int64)
+        self.lives = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.invincibility = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)
+        self.cleared = np.zeros(n, dtype=bool)
+        self.window_left = np.zeros(n, dtype=np.int64)
+        self.window_right = np.zeros(n, dtype=np.int64)
+        self.e_x = np.zeros((n, e), dtype=np.int64)
+        self.e_direction = np.zeros((n, e), dtype=np.int64)
+        self.e_alive = np.zeros((n, e), dtype=bool)
+        self.pu_alive = np.zeros((n, u), dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        """Put the copies selected by a boolean mask (all by default) at the level start, as GameWorld.enter_node does"""
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        self.x[mask] = 50
+        self.y[mask] = self.start_y
+        self.velocity_y[mask] = 0
+        self.jumping[mask] = False
+        self.health[mask] = 3
+        self.lives[mask] = 3
+        self.score[mask] = 0
+        self.invincibility[mask] = 0
+        self.done[mask] = False
+        self.cleared[mask] = False
+        self.e_x[mask] = self.e_start_x
+        self.e_direction[mask] = self.e_start_direction
+        self.e_alive[mask] = True
+        self.pu_alive[mask] = True
+        self._update_window()
+        return self.observe()
+
+    def _update_window(self):
+        """GameWorld.update_level_window: half a screen either side of the camera's column"""
+        camera = np.maximum(0, np.minimum(self.x + game.PLAYER_WIDTH // 2 - game.SCREEN_WIDTH // 2, self.width - game.SCREEN_WIDTH))
+        column = camera // game.ACTIVE_COLUMN
+        self.window_left = (column - 1) * game.ACTIVE_COLUMN
+        self.window_right = (column + 4) * game.ACTIVE_COLUMN
+
+    def _enemies_active(self):
+        return self.e_alive & (self.e_right > self.window_left[:, None]) & (self.e_left < self.window_right[:, None])
+
+    def _touching(self, x, top, platforms):
+        """Per copy, whether a player rect at (x, top) overlaps any of the selected platforms"""
+        hits = overlaps(x[:, None], top[:, None], game.PLAYER_WIDTH, game.PLAYER_HEIGHT, self.p_left, self.p_top, self.p_width, self.p_height)
+        return (hits & platforms).any(axis=1)
+
+    def _lose_life(self, dead, respawn):
+        """Copies whose health hit zero lose a life; the game ends at zero lives, otherwise health refills"""
+        self.lives[dead] -= 1
+        over = dead & (self.lives <= 0)
+        self.health[dead & ~over] = 3
+        self.x[respawn] = 50
+        self.y[respawn] = self.start_y
+        return over
+
+    def step(self, actions):
+        """Advance every live copy one tick on its action mask; returns (observations, rewards, dones)"""
+        actions = np.asarray(actions, dtype=np.int64)
+        live = ~self.done
+        score_before, lives_before = self.score.copy(), self.lives.copy()
+        width, height = game.PLAYER_WIDTH, game.PLAYER_HEIGHT
+
+        # handle_level_input
+        top = np.trunc(self.y).astype(np.int64)
+        move = live & (actions & LEFT != 0)
+        new_x = self.x - game.player_speed
+        move &= ~self._touching(new_x, top, self.p_solid)
+        self.x[move] = np.maximum(0, new_x[move])
+        move = live & (actions & RIGHT != 0)
+        new_x = self.x + game.player_speed
+        move &= ~self._touching(new_x, top, self.p_solid)
+        self.x[move] = np.minimum(self.width - width, new_x[move])
+        jump = live & (actions & JUMP != 0) & ~self.jumping
+        self.velocity_y[jump] = game.player_jump
+        self.jumping[jump] = True
+
+        # update_physics
+        self.invincibility[live & (self.invincibility > 0)] -= 1
+        velocity_y = np.where(live, np.minimum(self.velocity_y + game.player_gravity, 20), self.velocity_y)
+        new_y = self.y + velocity_y
+        top = np.trunc(new_y).astype(np.int64)
+        x = self.x.copy()
+        bottom = top + height
+
+        touching = overlaps(x[:, None], top[:, None], width, height, self.p_left, self.p_top, self.p_width, self.p_height)
+        landing = touching & (velocity_y > 0)[:, None] & (bottom[:, None] <= self.p_top + 10)
+        lands = live & landing.any(axis=1)
+        first = np.argmax(landing, axis=1)
+        self.y = np.where(lands, self.p_top[first] - height, np.where(live, new_y, self.y))
+        velocity_y[lands] = 0
+        self.jumping = np.where(live, ~lands, self.jumping)
+        ceiling = live & (self.y < 0)
+        self.y[ceiling] = 0
+        velocity_y[ceiling] = 0
+        self.velocity_y = velocity_y
+
+        # Walkers are handled in spawn order until a hit takes the last health point
+        vulnerable = live & (self.invincibility <= 0)
+        colliding = vulnerable[:, None] & self._enemies_active() & overlaps(x[:, None], top[:, None], width, height, self.e_x, self.e_y, ENEMY_SIZE, ENEMY_SIZE)
+        stomps = colliding & (velocity_y > 0)[:, None] & (bottom[:, None] < self.e_y + ENEMY_SIZE // 2)
+        hits = colliding & ~stomps
+        fatal = np.cumsum(hits, axis=1) >= self.health[:, None]
+        killed = hits & fatal
+        dead = killed.any(axis=1)
+        cutoff = np.where(dead, np.argmax(killed, axis=1), hits.shape[1])
+        handled = np.arange(hits.shape[1]) <= cutoff[:, None]
+        stomps &= handled
+        hit_count = (hits & handled).sum(axis=1)
+        self.e_alive &= ~stomps
+        self.score += 100 * stomps.sum(axis=1)
+        self.health -= hit_count
+        self.invincibility[hit_count > 0] = game.INVINCIBILITY_DURATION
+        over = self._lose_life(dead, dead & (self.lives > 1))
+
+        pu_active = self.pu_alive & (self.pu_x + PU_SIZE > self.window_left[:, None]) & (self.pu_x < self.window_right[:, None])
+        collected = live[:, None] & pu_active & overlaps(x[:, None], top[:, None], width, height, self.pu_x, self.pu_y, PU_SIZE, PU_SIZE)
+        count = collected.sum(axis=1)
+        self.health = np.where(count > 0, np.minimum(3, self.health + count), self.health)
+        self.pu_alive &= ~collected
+        self.score += 50 * count
+
+        burnt = live & (self.invincibility <= 0) & self._touching(x, top, self.p_hazard)
+        self.health[burnt] -= 1
+        self.velocity_y[burnt] = game.player_jump
+        self.invincibility[burnt] = game.INVINCIBILITY_DURATION
+        dead = burnt & (self.health <= 0)
+        over |= self._lose_life(dead, dead)
+
+        fell = live & (self.y > game.SCREEN_HEIGHT) & (self.invincibility <= 0)
+        self.health[fell] -= 1
+        self.invincibility[fell] = game.INVINCIBILITY_DURATION
+        over |= self._lose_life(fell & (self.health <= 0), fell)
+
+        cleared = np.zeros(self.n, dtype=bool)
+        if self.exit is not None:
+            cleared = live & overlaps(x, top, width, height, self.exit.x, self.exit.y, self.exit.width, self.exit.height)
+
+        # update_level_window, then the walkers inside it patrol
+        self._update_window()
+        patrol = live[:, None] & self._enemies_active()
+        e_x = np.where(patrol, self.e_x + self.e_speed * self.e_direction, self.e_x)
+        turn = patrol & ((e_x + ENEMY_SIZE > self.e_right) | (e_x < self.e_left))
+        self.e_x = e_x
+        self.e_direction = np.where(turn, -self.e_direction, self.e_direction)
+
+        self.cleared |= cleared
+        self.done |= over | cleared
+        rewards = (self.score - score_before) + CLEAR_REWARD * cleared - DEATH_PENALTY * (lives_before - self.lives)
+        return self.observe(), rewards.astype(np.float32), self.done.copy()
+
+    def observe(self):
+        """One float32 row of OBSERVATION_FIELDS per copy; enemy offsets are to the nearest live walker"""
+        exit_x, exit_y = self.exit.center if self.exit is not None else (self.width, 0)
+        center_x, center_y = self.x + game.PLAYER_WIDTH // 2, self.y + game.PLAYER_HEIGHT // 2
+        enemy_dx = self.e_x + ENEMY_SIZE // 2 - center_x[:, None]
+        enemy_dy = self.e_y + ENEMY_SIZE // 2 - center_y[:, None]
+        if enemy_dx.shape[1]:
+            distance = np.where(self.e_alive, np.abs(enemy_dx) + np.abs(enemy_dy), np.inf)
+            nearest = np.argmin(distance, axis=1)
+            rows = np.arange(self.n)
+            none = ~self.e_alive.any(axis=1)
+            enemy_dx = np.where(none, 0, enemy_dx[rows, nearest])
+            enemy_dy = np.where(none, 0, enemy_dy[rows, nearest])
+        else:
+            enemy_dx = enemy_dy = np.zeros(self.n)
+        return np.stack([self.x, self.y, self.velocity_y, self.jumping, self.health, self.lives, self.invincibility,
+                         exit_x - center_x, exit_y - center_y, enemy_dx, enemy_dy], axis=1).astype(np.float32)
+
+def world_state(world):
+    return (world.player_x, world.player_y, world.player_velocity_y, world.is_jumping, world.player_health,
+            world.player_lives, world.player_score, world.invincibility_timer, sorted(rect.x for rect in world.enemies.rects()))
+
+def batch_state(env, i):
+    return (int(env.x[i]), float(env.y[i]), float(env.velocity_y[i]), bool(env.jumping[i]), int(env.health[i]),
+            int(env.lives[i]), int(env.score[i]), int(env.invincibility[i]), sorted(int(x) for x in env.e_x[i][env.e_alive[i]]))
+
+def validate(node_id, envs, ticks, seed, level_screens=1):
+    """Step the batch and one GameWorld per copy on the same random actions; returns the first mismatch or None"""
+    rng = random.Random(seed)
+    # Mostly heading right, so copies reach walkers, power-ups and the exit as well as pits
+    actions = [rng.choices((0, LEFT, RIGHT, JUMP, RIGHT | JUMP, LEFT | JUMP), (1, 1, 4, 1, 3, 1), k=envs) for _ in range(ticks)]
+    env = BatchLevelEnv(node_id, envs, level_screens)
+    worlds = []
+    for _ in range(envs):
+        world = game.GameWorld(level_screens=level_screens)
+        world.enter_node(node_id)
+        worlds.append(world)
+    for tick in range(ticks):
+        _, _, dones = env.step(actions[tick])
+        for i, world in enumerate(worlds):
+            if world.game_state != game.STATE_LEVEL:
+                continue
+            world.step(actions[tick][i])
+            expected, got = world_state(world), batch_state(env, i)
+            if expected != got:
+                return f"copy {i} tick {tick}: GameWorld {expected} batch {got}"
+            if dones[i] != (world.game_state != game.STATE_LEVEL):
+                return f"copy {i} tick {tick}: done {dones[i]} but GameWorld is in {world.game_state}"
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Step many copies of a level in lockstep with NumPy and report throughput")
+    parser.add_argument("--node", type=int, default=0, help="campaign map node whose level is batched")
+    parser.add_argument("--envs", type=int, default=1024, help="copies stepped together")
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--level-screens", type=int, default=1, metavar="N")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random actions")
+    parser.add_argument("--validate", action="store_true", help="check every copy against a scalar GameWorld on the same actions")
+    args = parser.parse_args()
+
+    if args.validate:
+        mismatch = validate(args.node, args.envs, args.ticks, args.seed, args.level_screens)
+        print(mismatch or f"{args.envs} copies matched GameWorld for {args.ticks} ticks")
+        sys.exit(1 if mismatch else 0)
+
+    env = BatchLevelEnv(args.node, args.envs, args.level_screens)
+    rng = np.random.default_rng(args.seed)
+    start_time = time.perf_counter()
+    for _ in range(args.ticks):
+        _, _, dones = env.step(rng.choice((0, LEFT, RIGHT, JUMP, RIGHT | JUMP), size=args.envs))
+        if dones.any():
+            env.reset(dones)
+    elapsed = time.perf_counter() - start_time
+    steps = args.envs * args.ticks
+    print(f"{steps} steps in {elapsed:.2f}s: {steps / elapsed:.0f} steps/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import collections
+import importlib.util
+import multiprocessing
+import concurrent.futures
+
+# Benchmarks draw on SDL's dummy driver and skip the blocking transition waits
+os.environ.setdefault("SMW_HEADLESS", "1")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+PHASES = ("input", "physics", "boss", "draw", "present")
+# GameWorld methods timed inside step(); whatever else step() spends counts as physics
+STEP_PHASES = {"handle_overworld_input": "input", "handle_level_input": "input", "update_boss": "boss"}
+DEFAULT_GAMES = ("grokmario4k.py", "smw1.0.py")
+
+def load_game(path):
+    name = os.path.splitext(os.path.basename(path))[0].replace(".", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    game = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(game)
+    return game
+
+def scripted_keys(game, world, frame):
+    """Run right, hop every 45 frames and turn back every 4 seconds so boss fights keep moving"""
+    pygame = game.pygame
+    keys = collections.defaultdict(bool)
+    if world.game_state == game.STATE_OVERWORLD:
+        keys[pygame.K_RIGHT] = True
+    else:
+        keys[pygame.K_RIGHT if frame // 240 % 2 == 0 else pygame.K_LEFT] = True
+        keys[pygame.K_SPACE] = frame % 45 == 0
+    return keys
+
+def enter_node(game, world, node_id):
+    """Start the level on node_id the way pressing Enter on the map does"""
+    world.current_node = node_id
+    world.target_node = None
+    world.game_state = game.STATE_OVERWORLD
+    world.player_lives = 3
+    world.player_health = 3
+    keys = collections.defaultdict(bool)
+    keys[game.pygame.K_RETURN] = True
+    world.handle_overworld_input(keys)
+
+def complete_all(game, world):
+    for node in game.overworld_nodes:
+        if hasattr(world, "complete_node"):
+            world.complete_node(node["id"])
+        else:
+            world.completed[node["id"]] = 1
+
+class PhaseTimer:
+    """Accumulates time per phase for the current frame; present time is caught by wrapping pygame.display,
+    input and boss time by wrapping the world class's STEP_PHASES methods"""
+    def __init__(self, pygame, world_class):
+        self.frame = dict.fromkeys(PHASES, 0.0)
+        self.pygame = pygame
+        self.flip = pygame.display.flip
+        self.update = pygame.display.update
+        pygame.display.flip = self._timed("present", self.flip)
+        pygame.display.update = self._timed("present", self.update)
+        self.world_class = world_class
+        self.methods = {name: getattr(world_class, name) for name in STEP_PHASES}
+        for name, phase in STEP_PHASES.items():
+            setattr(world_class, name, self._timed(phase, self.methods[name]))
+
+    def _timed(self, phase, func):
+        def wrapper(*args):
+            start = time.perf_counter()
+            result = func(*args)
+            self.frame[phase] += time.perf_counter() - start
+            return result
+        return wrapper
+
+    def take(self):
+        frame = self.frame
+        self.frame = dict.fromkeys(PHASES, 0.0)
+        return frame
+
+    def restore(self):
+        self.pygame.display.flip = self.flip
+        self.pygame.display.update = self.update
+        for name, method in self.methods.items():
+            setattr(self.world_class, name, method)
+
+def draw(game, world):
+    if hasattr(world, "render"):
+        world.render()
+    else:
+        world.draw()
+        game.pygame.display.flip()
+
+def run_frame(game, world, timer, keys):
+    """One world.step() split into phases, then a draw"""
+    frame = timer.frame
+    nested_before = frame["input"] + frame["boss"]
+    step_start = time.perf_counter()
+    world.step(keys)
+    frame["physics"] += time.perf_counter() - step_start - (frame["input"] + frame["boss"] - nested_before)
+    draw_start = time.perf_counter()
+    present_before = timer.frame["present"]
+    draw(game, world)
+    timer.frame["draw"] += time.perf_counter() - draw_start - (timer.frame["present"] - present_before)
+
+def play(game, timer, node_id, frames, traced=False):
+    """Play frames of one scenario in a fresh world; returns per-frame phase dicts and transient allocation sizes"""
+    world = game.GameWorld(0)
+    if node_id is None:
+        complete_all(game, world)
+    samples, allocations = [], []
+    for frame in range(frames):
+        if node_id is not None and (frame == 0 or world.game_state == game.STATE_OVERWORLD):
+            enter_node(game, world, node_id)
+            timer.take()
+        if traced:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        run_frame(game, world, timer, scripted_keys(game, world, frame))
+        if traced:
+            allocations.append(tracemalloc.get_traced_memory()[1] - before)
+        samples.append(timer.take())
+    return samples, allocations
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(samples, allocations, gc_collections):
+    totals = [sum(sample.values()) for sample in samples]
+    return {
+        "frames": len(samples),
+        "phases_ms": {phase: round(1000 * sum(sample[phase] for sample in samples) / len(samples), 4) for phase in PHASES},
+        "frame_mean_ms": round(1000 * sum(totals) / len(totals), 4),
+        "frame_p99_ms": round(1000 * percentile(totals, 0.99), 4),
+        "alloc_peak_bytes_per_frame": round(sum(allocations) / len(allocations)) if allocations else None,
+        "gc_collections": gc_collections,
+    }
+
+def gc_collections():
+    return sum(stat["collections"] for stat in gc.get_stats())
+
+def benchmark_game(path, frames):
+    game = load_game(path)
+    timer = PhaseTimer(game.pygame, game.GameWorld)
+    results = {}
+    scenarios = [("overworld", None)] + [(node["level"], node["id"]) for node in game.overworld_nodes]
+    for name, node_id in scenarios:
+        collections_before = gc_collections()
+        samples, _ = play(game, timer, node_id, frames)
+        collections_after = gc_collections()
+        # Allocation tracing slows everything down, so it gets its own pass
+        tracemalloc.start()
+        _, allocations = play(game, timer, node_id, frames, traced=True)
+        tracemalloc.stop()
+        results[name] = summarize(samples, allocations, collections_after - collections_before)
+    timer.restore()
+    return {"game": os.path.basename(path), "pygame": game.pygame.version.ver, "scenarios": results}
+
+def play_replay(game, timer, replay):
+    """Run a loaded recording frame by frame in the world it was made in; returns that world and per-frame phase dicts"""
+    world = game.replay_world(replay)
+    samples = []
+    for mask in replay.masks:
+        run_frame(game, world, timer, game.mask_to_keys(mask))
+        samples.append(timer.take())
+    return world, samples
+
+def benchmark_replay(path, replay_path):
+    """Time a recorded session; replays only reproduce from a fresh game, so this runs in its own process"""
+    game = load_game(path)
+    timer = PhaseTimer(game.pygame, game.GameWorld)
+    collections_before = gc_collections()
+    _, samples = play_replay(game, timer, game.load_replay(replay_path))
+    collections_after = gc_collections()
+    timer.restore()
+    return summarize(samples, None, collections_after - collections_before)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline, threshold):
+    """Print per-scenario mean/p99 ratios against a previous run; returns the regressions"""
+    regressions = []
+    for game in results["games"]:
+        old_game = next((old for old in baseline["games"] if old["game"] == game["game"]), None)
+        if old_game is None:
+            continue
+        for name, stats in game["scenarios"].items():
+            old = old_game["scenarios"].get(name)
+            if old is None:
+                continue
+            for metric in ("frame_mean_ms", "frame_p99_ms"):
+                ratio = stats[metric] / old[metric] if old[metric] else 1.0
+                if ratio > 1 + threshold:
+                    regressions.append(f"{game['game']} {name} {metric}: {old[metric]:.3f} -> {stats[metric]:.3f} ms ({ratio:.2f}x)")
+    for line in regressions:
+        print(line, file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the overworld, every level and every boss fight of the game scripts")
+    parser.add_argument("games", nargs="*", default=DEFAULT_GAMES, help="game scripts to benchmark")
+    parser.add_argument("--frames", type=int, default=600, help="frames per scenario")
+    parser.add_argument("--replay", metavar="PATH", help=f"also benchmark a recording made with {DEFAULT_GAMES[0]} --record")
+    parser.add_argument("--out", help="write results JSON here instead of stdout")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against an earlier results JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {"commit": git_commit(), "python": platform.python_version(), "frames": args.frames, "games": []}
+    # Each game opens its own display, so every script runs in a fresh process, one at a time
+    context = multiprocessing.get_context("spawn")
+    for path in args.games:
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+            game_results = pool.submit(benchmark_game, os.path.join(here, path), args.frames).result()
+        if args.replay and path == DEFAULT_GAMES[0]:
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+                game_results["scenarios"]["replay"] = pool.submit(benchmark_replay, os.path.join(here, path), args.replay).result()
+        results["games"].append(game_results)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,32 @@
 import pygame
 import asyncio
+import argparse
+import collections
+import functools
+import os
+import time
 import sys
 import math
 import random
 import hashlib
+import itertools
+import bisect
+import struct
+import array
+import zlib
+import json
+import concurrent.futures
+
+try:
+    import numpy as np
+except ImportError:  # Vectorized enemy engine is optional
+    np = None
+
+# Headless mode: dummy video driver, no drawing and no frame cap
+HEADLESS = "--headless" in sys.argv or os.environ.get("SMW_HEADLESS") == "1"
+if HEADLESS:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
 
 # Initialize Pygame
 pygame.init()
@@ -29,51 +52,41 @@ LAVA_RED = (255, 69, 0)
 STATE_OVERWORLD = "overworld"
 STATE_LEVEL = "level"
 STATE_BOSS = "boss"
-game_state = STATE_OVERWORLD
-current_level = None
-current_world = 1
-current_level_num = None
+STATE_TRANSITION = "transition"
 
 # Player settings
 PLAYER_WIDTH = 40
 PLAYER_HEIGHT = 60
-player_x = 50
-player_y = SCREEN_HEIGHT - PLAYER_HEIGHT - 10
 player_speed = 5
 player_jump = -15
 player_gravity = 0.8
-player_velocity_y = 0
-is_jumping = False
-player_health = 3
-player_lives = 3
-player_score = 0
-invincibility_timer = 0
 INVINCIBILITY_DURATION = 60  # Frames of invincibility after damage
 
-def get_start_y():
-    global platforms, PLAYER_HEIGHT, SCREEN_HEIGHT
-    if platforms and len(platforms) > 0 and platforms[0].top < SCREEN_HEIGHT - 50:
-        return platforms[0].top - PLAYER_HEIGHT
+def get_start_y(level_platforms):
+    if level_platforms and len(level_platforms) > 0 and level_platforms[0].top < SCREEN_HEIGHT - 50:
+        return level_platforms[0].top - PLAYER_HEIGHT
     return SCREEN_HEIGHT - PLAYER_HEIGHT - 50
 
 # Platform settings
-def get_platforms_for_level(world, level):
-    """Procedurally generate platforms based on world and level"""
-    # Use a hash of the level name for consistent random generation
-    seed = int(hashlib.md5(current_level.encode()).hexdigest(), 16) % (2**32)
-    random.seed(seed)
-    
+def level_seed(level_name):
+    return int(hashlib.md5(level_name.encode()).hexdigest(), 16) % (2**32)
+
+def platform_in_bounds(p, width=SCREEN_WIDTH):
+    return p.right > 50 and p.left < width - 50 and p.bottom < SCREEN_HEIGHT - 20 and p.top > 50
+
+def layout_platforms(world, level, is_boss, rng):
+    """Procedurally generate platforms based on world and level, before the bounds filter"""
     base_ground = pygame.Rect(0, SCREEN_HEIGHT - 40, SCREEN_WIDTH, 40)
     platforms = [base_ground] if world != 5 else []  # No ground in sky world
-    num_platforms = 2 + level if not overworld_nodes[current_node]["is_boss"] else 1
+    num_platforms = 2 + level if not is_boss else 1
 
     if world == 1:  # Grasslands - linear with slight variation
         start_x = 150
         last_y = SCREEN_HEIGHT - 100
         for i in range(num_platforms):
-            x = start_x + i * 150 + random.randint(-50, 50)
-            y = min(last_y + random.randint(-60, 60), SCREEN_HEIGHT - 100)
-            w = random.randint(120, 220)
+            x = start_x + i * 150 + rng.randint(-50, 50)
+            y = min(last_y + rng.randint(-60, 60), SCREEN_HEIGHT - 100)
+            w = rng.randint(120, 220)
             platforms.append(pygame.Rect(max(50, x), max(100, y), w, 20))
             last_y = y
 
@@ -81,18 +94,18 @@ def get_platforms_for_level(world, level):
         start_x = 200
         last_y = SCREEN_HEIGHT - 100
         for i in range(num_platforms):
-            x = start_x + i * 180 + random.randint(-30, 30)
-            y = min(last_y + random.randint(-50, 50), SCREEN_HEIGHT - 100)
-            w = random.randint(150, 250)
+            x = start_x + i * 180 + rng.randint(-30, 30)
+            y = min(last_y + rng.randint(-50, 50), SCREEN_HEIGHT - 100)
+            w = rng.randint(150, 250)
             platforms.append(pygame.Rect(max(50, x), max(100, y), w, 20))
             last_y = y
 
     elif world == 3:  # Forest - vertical climb
         current_y = SCREEN_HEIGHT - 100
         for i in range(num_platforms):
-            x = random.randint(100, SCREEN_WIDTH - 200)
-            y = current_y - random.randint(80, 120)
-            w = random.randint(100, 180)
+            x = rng.randint(100, SCREEN_WIDTH - 200)
+            y = current_y - rng.randint(80, 120)
+            w = rng.randint(100, 180)
             platforms.append(pygame.Rect(x, max(100, y), w, 20))
             current_y = y
 
@@ -102,31 +115,349 @@ def get_platforms_for_level(world, level):
         start_x = 100 * level
         last_y = SCREEN_HEIGHT - 100
         for i in range(num_platforms):
-            x = start_x + i * 200 + random.randint(-40, 40)
-            y = min(last_y + random.randint(-50, 50), SCREEN_HEIGHT - 100)
-            w = random.randint(180, 280)
+            x = start_x + i * 200 + rng.randint(-40, 40)
+            y = min(last_y + rng.randint(-50, 50), SCREEN_HEIGHT - 100)
+            w = rng.randint(180, 280)
             platforms.append(pygame.Rect(max(50, x), max(100, y), w, 20))
             last_y = y
 
     elif world == 5:  # Sky - floating islands
         for i in range(num_platforms + 2):
-            x = random.randint(50, SCREEN_WIDTH - 150)
-            y = random.randint(150, SCREEN_HEIGHT - 150)
-            w = random.randint(120, 200)
+            x = rng.randint(50, SCREEN_WIDTH - 150)
+            y = rng.randint(150, SCREEN_HEIGHT - 150)
+            w = rng.randint(120, 200)
             platforms.append(pygame.Rect(x, y, w, 20))
 
     else:  # Boss arenas
-        platforms = [base_ground, pygame.Rect(100, 300 + random.randint(-50, 50), 600, 20)]
+        platforms = [base_ground, pygame.Rect(100, 300 + rng.randint(-50, 50), 600, 20)]
 
-    # Ensure platforms are within bounds and reachable
-    platforms = [p for p in platforms if p.right > 50 and p.left < SCREEN_WIDTH - 50 and p.bottom < SCREEN_HEIGHT - 20 and p.top > 50]
-    
     return platforms
 
-platforms = []
+BRIDGE_STEP_RISE = 100  # Highest climb between bridge steps, well inside a jump
+
+def bridge_platforms(last, first):
+    """Steps from the platform a screen ends on to the first platform of the next, climbing at most BRIDGE_STEP_RISE each"""
+    span = first.left - last.right
+    if span <= 0:
+        return []
+    rise = max(0, last.top - first.top)
+    steps = max(1, -(-rise // BRIDGE_STEP_RISE))
+    return [pygame.Rect(last.right + span * i // steps, first.top + rise * (steps - 1 - i) // steps, max(PLAYER_WIDTH, span // steps), 20)
+            for i in range(steps)]
+
+def screen_layouts(world, level, level_name, is_boss, rng=random, screens=1):
+    """Platforms of each screen of a level, in level coordinates"""
+    # Use a hash of the level name for consistent random generation
+    rng.seed(level_seed(level_name))
+    # Long stages are one world layout per screen, laid end to end; each screen is bounds-checked on its own,
+    # and its platforms cut at the screen edge, so no layout spills onto the next
+    for screen_index in range(screens):
+        layout = [p for p in layout_platforms(world, level, is_boss, rng) if platform_in_bounds(p, SCREEN_WIDTH)]
+        if screens > 1:
+            layout = [p.clip(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT) for p in layout]
+        yield [p.move(screen_index * SCREEN_WIDTH, 0) for p in layout]
+
+def get_platforms_for_level(world, level, level_name, is_boss, rng=random, screens=1):
+    platforms = []
+    last = None
+    for layout in screen_layouts(world, level, level_name, is_boss, rng, screens):
+        # Bridge from the platform the previous screen's exit would sit on to the one this screen spawns on
+        if last is not None and layout:
+            platforms.extend(bridge_platforms(last, layout[0]))
+        platforms.extend(layout)
+        if layout:
+            last = max(layout, key=lambda p: p.right)
+    return platforms
+
+def is_hazard(platform):
+    return platform.y == SCREEN_HEIGHT - 60
+
+class PlatformGrid:
+    """Uniform grid over a level's platforms, built once per level for overlap queries"""
+    __slots__ = ("platforms", "hazards", "cells")
+    CELL_SIZE = 128
+
+    def __init__(self, platforms):
+        self.platforms = platforms
+        self.hazards = {i for i, p in enumerate(platforms) if is_hazard(p)}
+        self.cells = {}
+        for i, p in enumerate(platforms):
+            for cell in self._cells_for(p):
+                self.cells.setdefault(cell, []).append(i)
+
+    def _cells_for(self, rect):
+        size = self.CELL_SIZE
+        for cx in range(rect.left // size, (rect.right - 1) // size + 1):
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                yield cx, cy
+
+    def overlapping(self, rect):
+        """Platforms overlapping rect, in level order"""
+        found = set()
+        for cell in self._cells_for(rect):
+            found.update(self.cells.get(cell, ()))
+        return [self.platforms[i] for i in sorted(found) if self.platforms[i].colliderect(rect)]
+
+    def any_solid(self, rect):
+        for cell in self._cells_for(rect):
+            for i in self.cells.get(cell, ()):
+                if i not in self.hazards and self.platforms[i].colliderect(rect):
+                    return True
+        return False
+
+    def any_hazard(self, rect):
+        for cell in self._cells_for(rect):
+            for i in self.cells.get(cell, ()):
+                if i in self.hazards and self.platforms[i].colliderect(rect):
+                    return True
+        return False
+
+# Level generation cache
+LEVEL_GENERATOR_VERSION = 3
+LevelLayout = collections.namedtuple("LevelLayout", "platforms grid exit_pos enemy_spawns power_up_spawns rng_state exit_reachable width")
+
+def exit_position(platforms, width=SCREEN_WIDTH):
+    """Exit sits on the platform that reaches furthest right"""
+    last_platform = max(platforms, key=lambda p: p.right)
+    return (min(last_platform.right - 50, width - 60), last_platform.top - 60)
+
+def place_spawns(valid_platforms, world, rng, enemy_spawns, power_up_spawns):
+    """A group of enemies on one platform and a power-up on another, appended as spawn points"""
+    if not valid_platforms:
+        return
+    enemy_platform = rng.choice(valid_platforms)
+    num_enemies = min(world, 3)  # Cap enemies for balance
+    for i in range(num_enemies):
+        x = rng.randint(enemy_platform.left + 10, enemy_platform.right - 40)
+        enemy_spawns.append((x, enemy_platform.top, enemy_platform))
+    
+    pu_platform = rng.choice(valid_platforms)
+    x = rng.randint(pu_platform.left + 10, pu_platform.right - 30)
+    y = pu_platform.top - 20
+    power_up_spawns.append((x, y))
+
+def generate_level(level_name, world, level_num, is_boss, screens=1):
+    """Platforms, exit and spawn points of a level, plus the RNG state its generation leaves behind"""
+    rng = random.Random()
+    if is_boss:
+        screens = 1
+    width = screens * SCREEN_WIDTH
+    platforms = get_platforms_for_level(world, level_num, level_name, is_boss, rng, screens)
+    
+    # Place exit on last platform for non-boss levels
+    exit_pos = None
+    exit_reachable = None
+    if not is_boss and platforms:
+        exit_pos = exit_position(platforms, width)
+        exit_reachable = analyze_reachability(platforms, pygame.Rect(exit_pos, EXIT_SIZE), width).exit_reachable
+    
+    enemy_spawns = []
+    power_up_spawns = []
+    if len(platforms) > 1 and not is_boss:
+        # Each screen of a long stage gets its own enemies and power-up
+        by_screen = [[] for _ in range(screens)]
+        for p in platforms[1:]:
+            if not is_hazard(p):
+                by_screen[min(screens - 1, max(0, p.centerx // SCREEN_WIDTH))].append(p)
+        for valid_platforms in by_screen:
+            place_spawns(valid_platforms, world, rng, enemy_spawns, power_up_spawns)
+    
+    return LevelLayout(platforms, PlatformGrid(platforms), exit_pos, enemy_spawns, power_up_spawns, rng.getstate(), exit_reachable, width)
+
+@functools.lru_cache(maxsize=64)
+def cached_level(level_name, world, level_num, is_boss, screens=1, version=LEVEL_GENERATOR_VERSION):
+    return generate_level(level_name, world, level_num, is_boss, screens)
+
+def node_level_num(node):
+    return node["level_num"]
+
+def level_for_node(node, screens=1):
+    return cached_level(node["level"], node["theme"], node_level_num(node), node["is_boss"], screens)
+
+# Reachability analysis
+Reachability = collections.namedtuple("Reachability", "platforms exit_reachable")
+
+@functools.lru_cache(maxsize=None)
+def jump_arc(feet, velocity_y):
+    """Feet height and vertical speed after each tick of an airborne arc, replaying update_physics"""
+    arc = []
+    y = feet - PLAYER_HEIGHT
+    while y <= SCREEN_HEIGHT:
+        velocity_y = min(velocity_y + player_gravity, 20)
+        y += velocity_y
+        # Collision rects truncate the float position, so compare whole pixels
+        arc.append((int(y) + PLAYER_HEIGHT, velocity_y))
+        if y < 0:
+            y = 0
+            velocity_y = 0
+    return tuple(arc)
+
+@functools.lru_cache(maxsize=None)
+def landing_envelope(feet, velocity_y):
+    """Descending part of an arc as parallel (ticks, feet heights) lists, feet heights ascending"""
+    ticks, heights = [], []
+    for tick, (height, vy) in enumerate(jump_arc(feet, velocity_y), 1):
+        if vy > 0:
+            ticks.append(tick)
+            heights.append(height)
+    return ticks, heights
+
+def landing_tick(feet, velocity_y, platform):
+    """Latest tick at which an arc can land on platform, or None if it tunnels past or misses the top"""
+    ticks, heights = landing_envelope(feet, velocity_y)
+    first = bisect.bisect_right(heights, platform.top)
+    last = bisect.bisect_right(heights, platform.top + 10) - 1
+    return ticks[last] if last >= first else None
+
+def standing_span(platform, width=SCREEN_WIDTH):
+    """Player x positions that overlap platform, clamped to the level"""
+    return max(0, platform.left - PLAYER_WIDTH + 1), min(width - PLAYER_WIDTH, platform.right - 1)
+
+def analyze_reachability(platforms, exit_rect=None, width=SCREEN_WIDTH):
+    """Which platforms (and the exit) the player can reach from the spawn point.
+
+    Every platform is a node; lava counts too, since update_physics lands
+    the player on it like any other platform. Edges are jumps and walk-offs
+    whose precomputed arc lands on another platform while the horizontal
+    reach (player_speed per tick) still overlaps it. Side blocking and
+    damage are ignored, so the answer is optimistic: unreachable really
+    means unreachable.
+    """
+    reachable = set()
+    # Spawn: is_jumping starts False, so the player may jump on the first tick as well as drop, and steer either way
+    spawn_x = 50
+    sources = [((spawn_x, spawn_x), get_start_y(platforms) + PLAYER_HEIGHT, (player_jump, 0), False)]
+    exit_reachable = False
+    while sources:
+        (left, right), feet, launches, standing = sources.pop()
+        if exit_rect is not None and not exit_reachable:
+            exit_reachable = arc_touches(left, right, feet, launches, standing, exit_rect)
+        for i in range(len(platforms)):
+            if i in reachable:
+                continue
+            target_left, target_right = standing_span(platforms[i], width)
+            for velocity_y in launches:
+                tick = landing_tick(feet, velocity_y, platforms[i])
+                if tick is not None and left - player_speed * tick <= target_right and right + player_speed * tick >= target_left:
+                    reachable.add(i)
+                    sources.append((standing_span(platforms[i], width), platforms[i].top, (player_jump, 0), True))
+                    break
+    return Reachability(reachable, exit_reachable if exit_rect is not None else None)
+
+def arc_touches(left, right, feet, launches, standing, rect):
+    """Whether the player, standing or anywhere along the given arcs, can overlap rect"""
+    if standing and pygame.Rect(left, feet - PLAYER_HEIGHT, right - left + PLAYER_WIDTH, PLAYER_HEIGHT).colliderect(rect):
+        return True
+    for velocity_y in launches:
+        for tick, (height, vy) in enumerate(jump_arc(feet, velocity_y), 1):
+            spread = player_speed * tick
+            if pygame.Rect(left - spread, height - PLAYER_HEIGHT, right - left + 2 * spread + PLAYER_WIDTH, PLAYER_HEIGHT).colliderect(rect):
+                return True
+    return False
+
+def report_unreachable_levels(nodes, screens=1):
+    for node in nodes:
+        layout = level_for_node(node, screens)
+        if layout.exit_reachable is False:
+            print(f"{node['level']}: exit unreachable")
+    print(f"Checked {len(nodes)} levels")
+
+# Endless mode: one screen-wide chunk at a time, seeded by its index so every run of a world is the same
+ENDLESS_AHEAD = 3  # Chunks kept loaded past the camera's
+ENDLESS_BEHIND = 1  # Chunks kept loaded behind it
+ENDLESS_PREFETCH = 2  # Chunks queued on the worker beyond the loaded ones
+EndlessChunk = collections.namedtuple("EndlessChunk", "index platforms enemy_spawns power_up_spawns")
+
+def generate_chunk(world, index):
+    """Platforms and spawns of chunk index, in level coordinates; denser the further the run gets"""
+    rng = random.Random(level_seed(f"endless_{world}_{index}"))
+    theme = (world - 1) % LEVEL_THEMES + 1
+    level = min(3, 1 + index // 8)
+    left = index * SCREEN_WIDTH
+    platforms = [p.move(left, 0) for p in layout_platforms(theme, level, False, rng) if platform_in_bounds(p)]
+    enemy_spawns, power_up_spawns = [], []
+    place_spawns([p for p in platforms[1:] if not is_hazard(p)], theme, rng, enemy_spawns, power_up_spawns)
+    return EndlessChunk(index, platforms, enemy_spawns, power_up_spawns)
+
+class EndlessLevel:
+    """Live chunks of an endless run, with the next few generated ahead on a worker thread"""
+    __slots__ = ("world", "chunks", "pending", "executor")
+
+    def __init__(self, world):
+        self.world = world
+        self.chunks = collections.deque()
+        self.pending = {}
+        self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="endless")
+
+    def load(self, index):
+        """Append chunk index, waiting for the worker only if it has not finished it yet"""
+        future = self.pending.pop(index, None)
+        chunk = future.result() if future is not None else generate_chunk(self.world, index)
+        self.chunks.append(chunk)
+        for i in range(index + 1, index + 1 + ENDLESS_PREFETCH):
+            if i not in self.pending:
+                self.pending[i] = self.executor.submit(generate_chunk, self.world, i)
+        return chunk
+
+    def spawn_point(self):
+        """Standing on the first solid platform of the oldest live chunk"""
+        for chunk in self.chunks:
+            for p in chunk.platforms:
+                if not is_hazard(p):
+                    return p.left + 10, p.top - PLAYER_HEIGHT
+        return self.chunks[0].index * SCREEN_WIDTH + 50, get_start_y(())
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# Sprites: every fixed-size entity is painted once into a display-format atlas and drawn with batched blits
+SPRITE_COLORKEY = (255, 0, 255)
+
+def paint_baby_bowser(surface):
+    surface.fill(RED)
+    pygame.draw.circle(surface, BLACK, (surface.get_width() - 10, 20), 10)
+
+# Name: (size, painter); painters draw at the sprite's top left, so swapping one for loaded art only changes this table
+SPRITE_PAINTERS = {
+    "walker": ((30, 30), lambda surface: pygame.draw.circle(surface, RED, (15, 15), 15)),
+    "heart": ((30, 30), lambda surface: pygame.draw.circle(surface, RED, (15, 15), 15)),
+    "power_up": ((20, 20), lambda surface: surface.fill(YELLOW)),
+    "player": ((PLAYER_WIDTH, PLAYER_HEIGHT), lambda surface: surface.fill(RED)),
+    # Polygon edges are inclusive, so Kamek's 50x70 triangle covers 51x71 pixels
+    "kamek": ((51, 71), lambda surface: pygame.draw.polygon(surface, BLUE, [(0, 70), (25, 0), (50, 70)])),
+    "baby_bowser": ((60, 80), paint_baby_bowser),
+    "baby_bowser_big": ((80, 100), paint_baby_bowser),
+}
+
+class SpriteAtlas:
+    """All sprites side by side on one colorkeyed display-format surface; entry() gives a Surface.blits item"""
+    __slots__ = ("surface", "areas")
+
+    def __init__(self, painters):
+        width = sum(size[0] for size, _ in painters.values())
+        height = max(size[1] for size, _ in painters.values())
+        self.surface = pygame.Surface((width, height)).convert()
+        self.surface.fill(SPRITE_COLORKEY)
+        self.areas = {}
+        x = 0
+        for name, (size, paint) in painters.items():
+            area = pygame.Rect((x, 0), size)
+            paint(self.surface.subsurface(area))
+            self.areas[name] = area
+            x += size[0]
+        self.surface.set_colorkey(SPRITE_COLORKEY, pygame.RLEACCEL)
+
+    def entry(self, name, x, y):
+        return (self.surface, (x, y), self.areas[name])
+
+atlas = SpriteAtlas(SPRITE_PAINTERS)
 
 # Enemies and Power-ups
+UNBOUNDED_WINDOW = (-math.inf, math.inf)
+
 class Enemy:
+    __slots__ = ("rect", "speed", "direction", "platform")
+
     def __init__(self, x, y, platform):
         self.rect = pygame.Rect(x, y - 20, 30, 30)
         self.speed = 2
@@ -138,28 +469,240 @@ class Enemy:
         if self.rect.right > self.platform.right or self.rect.left < self.platform.left:
             self.direction *= -1
 
-    def draw(self):
-        pygame.draw.circle(screen, RED, self.rect.center, 15)
+    def sprite(self, camera_x=0):
+        return atlas.entry("walker", self.rect.x - camera_x, self.rect.y)
+
+class EnemyGroup:
+    """Reference walker engine: one Enemy object per walker"""
+    __slots__ = ("enemies", "window", "active")
+
+    def __init__(self):
+        self.enemies = []
+        self.window = UNBOUNDED_WINDOW
+        self.active = []
+
+    def __len__(self):
+        return len(self.enemies)
+
+    def _in_window(self, enemy):
+        return enemy.platform.right > self.window[0] and enemy.platform.left < self.window[1]
+
+    def set_window(self, left, right):
+        """Only walkers whose platform reaches into [left, right) are updated, collided and drawn"""
+        if (left, right) != self.window:
+            self.window = (left, right)
+            self.active = [i for i, enemy in enumerate(self.enemies) if self._in_window(enemy)]
+
+    def spawn(self, x, y, platform):
+        self.enemies.append(Enemy(x, y, platform))
+        if self._in_window(self.enemies[-1]):
+            self.active.append(len(self.enemies) - 1)
+
+    def clear(self):
+        self.enemies.clear()
+        self.active.clear()
+
+    def rects(self):
+        return [enemy.rect for enemy in self.enemies]
+
+    def update(self):
+        enemies = self.enemies
+        for i in self.active:
+            enemies[i].update()
+
+    def colliding(self, rect):
+        """(index, rect) of every active walker overlapping rect, in spawn order"""
+        enemies = self.enemies
+        return [(i, enemies[i].rect) for i in self.active if rect.colliderect(enemies[i].rect)]
+
+    def remove(self, indices):
+        if not indices:
+            return
+        for i in sorted(indices, reverse=True):
+            del self.enemies[i]
+        self.active = [i for i, enemy in enumerate(self.enemies) if self._in_window(enemy)]
+
+    def walkers(self):
+        """(x, y, speed, direction, patrol left, patrol right) of every walker, in spawn order"""
+        return [(e.rect.x, e.rect.y, e.speed, e.direction, e.platform.left, e.platform.right) for e in self.enemies]
+
+    def load(self, walkers):
+        """Replace every walker with those walkers() returned; a bounds rect stands in for each platform"""
+        self.enemies = []
+        for x, y, speed, direction, left, right in walkers:
+            enemy = Enemy(x, y + 20, pygame.Rect(left, 0, right - left, 0))
+            enemy.speed = speed
+            enemy.direction = direction
+            self.enemies.append(enemy)
+        self.active = [i for i, enemy in enumerate(self.enemies) if self._in_window(enemy)]
+
+    def sprites(self, camera_x=0):
+        enemies = self.enemies
+        return [enemies[i].sprite(camera_x) for i in self.active]
+
+class VectorEnemyGroup:
+    """Struct-of-arrays walker engine that patrols and collides every walker with NumPy"""
+    __slots__ = ("count", "window", "active", "x", "y", "speed", "direction", "left", "right")
+    SIZE = 30
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.window = UNBOUNDED_WINDOW
+        self.active = np.zeros(0, dtype=np.intp)
+        self.x = np.zeros(capacity, dtype=np.int64)
+        self.y = np.zeros(capacity, dtype=np.int64)
+        self.speed = np.zeros(capacity, dtype=np.int64)
+        self.direction = np.zeros(capacity, dtype=np.int64)
+        self.left = np.zeros(capacity, dtype=np.int64)
+        self.right = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.count
 
-enemies = []
+    def _arrays(self):
+        return ("x", "y", "speed", "direction", "left", "right")
+
+    def _refresh_active(self):
+        n = self.count
+        self.active = np.flatnonzero((self.right[:n] > self.window[0]) & (self.left[:n] < self.window[1]))
+
+    def set_window(self, left, right):
+        """Only walkers whose platform reaches into [left, right) are updated, collided and drawn"""
+        if (left, right) != self.window:
+            self.window = (left, right)
+            self._refresh_active()
+
+    def spawn(self, x, y, platform):
+        if self.count == len(self.x):
+            for name in self._arrays():
+                setattr(self, name, np.resize(getattr(self, name), 2 * self.count))
+        i = self.count
+        reference = Enemy(x, y, platform)
+        self.x[i], self.y[i] = reference.rect.topleft
+        self.speed[i] = reference.speed
+        self.direction[i] = reference.direction
+        self.left[i], self.right[i] = platform.left, platform.right
+        self.count += 1
+        if platform.right > self.window[0] and platform.left < self.window[1]:
+            self.active = np.append(self.active, i)
+
+    def clear(self):
+        self.count = 0
+        self.active = self.active[:0]
+
+    def rects(self):
+        return [pygame.Rect(int(x), int(y), self.SIZE, self.SIZE) for x, y in zip(self.x[:self.count], self.y[:self.count])]
+
+    def update(self):
+        active = self.active
+        x = self.x[active] + self.speed[active] * self.direction[active]
+        self.x[active] = x
+        turn = (x + self.SIZE > self.right[active]) | (x < self.left[active])
+        self.direction[active[turn]] *= -1
+
+    def colliding(self, rect):
+        """(index, rect) of every active walker overlapping rect, in spawn order"""
+        active = self.active
+        x, y = self.x[active], self.y[active]
+        hits = np.flatnonzero((x < rect.right) & (x + self.SIZE > rect.left) & (y < rect.bottom) & (y + self.SIZE > rect.top))
+        return [(int(active[i]), pygame.Rect(int(x[i]), int(y[i]), self.SIZE, self.SIZE)) for i in hits]
+
+    def remove(self, indices):
+        if not indices:
+            return
+        keep = np.ones(self.count, dtype=bool)
+        keep[list(indices)] = False
+        for name in self._arrays():
+            array = getattr(self, name)
+            kept = array[:self.count][keep]
+            array[:len(kept)] = kept
+        self.count = int(keep.sum())
+        self._refresh_active()
+
+    def walkers(self):
+        """(x, y, speed, direction, patrol left, patrol right) of every walker, in spawn order"""
+        n = self.count
+        return list(zip(*(getattr(self, name)[:n].tolist() for name in self._arrays())))
+
+    def load(self, walkers):
+        """Replace every walker with those walkers() returned"""
+        n = len(walkers)
+        if n > len(self.x):
+            for name in self._arrays():
+                setattr(self, name, np.zeros(n, dtype=np.int64))
+        if n:
+            columns = np.array(walkers, dtype=np.int64).T
+            for name, column in zip(self._arrays(), columns):
+                getattr(self, name)[:n] = column
+        self.count = n
+        self._refresh_active()
+
+    def sprites(self, camera_x=0):
+        surface, area = atlas.surface, atlas.areas["walker"]
+        active = self.active
+        return [(surface, (x - camera_x, y), area) for x, y in zip(self.x[active].tolist(), self.y[active].tolist())]
+
+def make_enemy_group(vectorized=False):
+    if vectorized and np is not None:
+        return VectorEnemyGroup()
+    return EnemyGroup()
 
 class PowerUp:
+    __slots__ = ("rect",)
+
     def __init__(self, x, y):
         self.rect = pygame.Rect(x, y, 20, 20)
 
-    def draw(self):
-        pygame.draw.rect(screen, YELLOW, self.rect)
+    def sprite(self, camera_x=0):
+        return atlas.entry("power_up", self.rect.x - camera_x, self.rect.y)
 
-    def collect(self):
-        global player_health
-        player_health = min(3, player_health + 1)
+    def collect(self, world):
+        world.player_health = min(3, world.player_health + 1)
         return True
 
-power_ups = []
-
 # Boss Classes
+class RectPool:
+    """Fixed-capacity store of boss shots: live rects are packed at the front, spare ones behind them"""
+    __slots__ = ("rects", "count")
+
+    def __init__(self, capacity=64):
+        self.rects = [pygame.Rect(0, 0, 0, 0) for _ in range(capacity)]
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return itertools.islice(self.rects, self.count)
+
+    def spawn(self, x, y, width, height):
+        """Reuse a spare rect for a new shot; the shot is dropped when the pool is full"""
+        if self.count == len(self.rects):
+            return None
+        rect = self.rects[self.count]
+        rect.update(x, y, width, height)
+        self.count += 1
+        return rect
+
+    def kill(self, index):
+        """Swap-remove: the last live rect takes the freed slot, the dead one becomes spare"""
+        self.count -= 1
+        rects = self.rects
+        rects[index], rects[self.count] = rects[self.count], rects[index]
+        rects[self.count].size = (0, 0)
+
+    def kill_all(self, indices):
+        for index in sorted(indices, reverse=True):
+            self.kill(index)
+
+    def colliding(self, rect):
+        """Indices of live rects overlapping rect; spare rects are empty and never collide"""
+        return rect.collidelistall(self.rects)
+
 class KamekBoss:
-    def __init__(self, world):
+    __slots__ = ("rect", "max_health", "health", "speed", "direction", "shoot_timer", "teleport_timer", "projectiles", "rng")
+
+    def __init__(self, world, rng=random):
         self.rect = pygame.Rect(SCREEN_WIDTH // 2, 100, 50, 70)
         self.max_health = 4 + world
         self.health = self.max_health
@@ -167,7 +710,8 @@ class KamekBoss:
         self.direction = 1
         self.shoot_timer = 0
         self.teleport_timer = 0
-        self.projectiles = []
+        self.projectiles = RectPool()
+        self.rng = rng
 
     def update(self):
         self.rect.x += self.speed * self.direction
@@ -177,53 +721,57 @@ class KamekBoss:
 
         self.shoot_timer += 1
         if self.shoot_timer > 60:
-            self.projectiles.append(pygame.Rect(self.rect.centerx, self.rect.bottom, 10, 10))
+            self.projectiles.spawn(self.rect.centerx, self.rect.bottom, 10, 10)
             self.shoot_timer = 0
 
         self.teleport_timer += 1
         if self.teleport_timer > 300:
-            self.rect.x = random.randint(50, SCREEN_WIDTH - 100)
-            self.rect.y = random.randint(50, 200)
+            self.rect.x = self.rng.randint(50, SCREEN_WIDTH - 100)
+            self.rect.y = self.rng.randint(50, 200)
             self.teleport_timer = 0
 
-        for proj in self.projectiles[:]:
-            proj.y += 5
-            if proj.y > SCREEN_HEIGHT:
-                self.projectiles.remove(proj)
+        rects = self.projectiles.rects
+        for i in range(len(self.projectiles) - 1, -1, -1):
+            rects[i].y += 5
+            if rects[i].y > SCREEN_HEIGHT:
+                self.projectiles.kill(i)
 
     def take_damage(self):
         self.health -= 1
         return self.health <= 0
 
     def draw(self):
-        pygame.draw.polygon(screen, BLUE, [(self.rect.left, self.rect.bottom), (self.rect.centerx, self.rect.top), (self.rect.right, self.rect.bottom)])
+        rects = screen.blits([atlas.entry("kamek", *self.rect.topleft)])
         for proj in self.projectiles:
-            pygame.draw.rect(screen, GREEN, proj)
+            rects.append(screen.fill(GREEN, proj))
+        return rects
 
 class BabyBowserBoss:
+    __slots__ = ("rect", "max_health", "health", "phase", "attack_timer", "projectiles", "shockwaves")
+
     def __init__(self):
         self.rect = pygame.Rect(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100, 60, 80)
         self.max_health = 10
         self.health = self.max_health
         self.phase = 1
         self.attack_timer = 0
-        self.projectiles = []
-        self.shockwaves = []
+        self.projectiles = RectPool()
+        self.shockwaves = RectPool()
 
     def update(self):
         self.attack_timer += 1
         if self.phase == 1:
             if self.attack_timer > 120:
-                self.shockwaves.append(pygame.Rect(self.rect.centerx - 50, self.rect.bottom, 100, 10))
+                self.shockwaves.spawn(self.rect.centerx - 50, self.rect.bottom, 100, 10)
                 self.attack_timer = 0
         elif self.phase == 2:
             if self.attack_timer > 90:
-                self.projectiles.append(pygame.Rect(self.rect.right, self.rect.centery, 20, 10))
+                self.projectiles.spawn(self.rect.right, self.rect.centery, 20, 10)
                 self.attack_timer = 0
         elif self.phase == 3:
             self.rect.y = max(100, self.rect.y - 1)
             if self.attack_timer > 60:
-                self.projectiles.append(pygame.Rect(self.rect.centerx, self.rect.bottom, 10, 10))
+                self.projectiles.spawn(self.rect.centerx, self.rect.bottom, 10, 10)
                 self.attack_timer = 0
 
         if self.health <= 7 and self.phase == 1:
@@ -233,421 +781,1328 @@ class BabyBowserBoss:
             self.phase = 3
             self.rect.y = 100
 
-        for wave in self.shockwaves[:]:
-            wave.inflate_ip(10, 0)
-            if wave.width > SCREEN_WIDTH:
-                self.shockwaves.remove(wave)
-        for proj in self.projectiles[:]:
-            proj.x -= 5
-            if proj.x < 0:
-                self.projectiles.remove(proj)
+        waves = self.shockwaves.rects
+        for i in range(len(self.shockwaves) - 1, -1, -1):
+            waves[i].inflate_ip(10, 0)
+            if waves[i].width > SCREEN_WIDTH:
+                self.shockwaves.kill(i)
+        rects = self.projectiles.rects
+        for i in range(len(self.projectiles) - 1, -1, -1):
+            rects[i].x -= 5
+            if rects[i].x < 0:
+                self.projectiles.kill(i)
 
     def take_damage(self):
         self.health -= 1
         return self.health <= 0
 
     def draw(self):
-        pygame.draw.rect(screen, RED, self.rect)
-        pygame.draw.circle(screen, BLACK, (self.rect.right - 10, self.rect.top + 20), 10)
+        rects = screen.blits([atlas.entry("baby_bowser" if self.phase == 1 else "baby_bowser_big", *self.rect.topleft)])
         for wave in self.shockwaves:
-            pygame.draw.rect(screen, YELLOW, wave)
+            rects.append(screen.fill(YELLOW, wave))
         for proj in self.projectiles:
-            pygame.draw.rect(screen, LAVA_RED, proj)
-
-boss = None
+            rects.append(screen.fill(LAVA_RED, proj))
+        return rects
 
 # Level exit
-level_exit = pygame.Rect(SCREEN_WIDTH - 60, SCREEN_HEIGHT - 100, 50, 60)
+EXIT_SIZE = (50, 60)
 
 # Overworld settings
 OVERWORLD_PLAYER_SIZE = 20
-overworld_player_pos = [100, 100]
 overworld_player_speed = 5
-overworld_nodes = []
-
-# Generate nodes for 5 worlds
-node_id = 0
-for world in range(1, 6):
-    for level in range(1, 5):
-        x = 100 + (node_id % 4) * 150
-        y = 100 + (node_id // 4) * 150
-        level_name = f"world_{world}_level_{level}"
-        overworld_nodes.append({"id": node_id, "pos": (x, y), "level": level_name, "completed": False, "world": world, "is_boss": level == 4})
-        node_id += 1
-
-# Final boss node
-overworld_nodes.append({"id": node_id, "pos": (600, 600), "level": "final_boss", "completed": False, "world": 6, "is_boss": True})
-
-overworld_paths = []
-for i in range(len(overworld_nodes) - 1):
-    if overworld_nodes[i]["world"] == overworld_nodes[i+1]["world"] or (overworld_nodes[i]["is_boss"] and overworld_nodes[i+1]["world"] == overworld_nodes[i]["world"] + 1):
-        overworld_paths.append((i, i+1))
-
-current_node = 0
-target_node = None
-move_progress = 0
+OVERWORLD_COLUMNS = 4
+OVERWORLD_SPACING = 150
+OVERWORLD_NODE_RADIUS = 30
+LEVEL_THEMES = 5  # Grasslands, desert, forest, castle, sky; bigger maps cycle through them
+
+def build_overworld(worlds=5, levels_per_world=4):
+    """Nodes in rows of four, each world ending in a boss, then the final boss; returns (nodes, paths)"""
+    nodes = []
+    for world in range(1, worlds + 1):
+        for level in range(1, levels_per_world + 1):
+            node_id = len(nodes)
+            x = 100 + (node_id % OVERWORLD_COLUMNS) * OVERWORLD_SPACING
+            y = 100 + (node_id // OVERWORLD_COLUMNS) * OVERWORLD_SPACING
+            level_name = f"world_{world}_level_{level}"
+            nodes.append({"id": node_id, "pos": (x, y), "level": level_name, "world": world,
+                          "theme": (world - 1) % LEVEL_THEMES + 1, "level_num": level, "is_boss": level == levels_per_world})
+    
+    # Final boss node on a row of its own; its theme falls outside the level styles, so it gets the arena
+    y = nodes[-1]["pos"][1] + OVERWORLD_SPACING
+    nodes.append({"id": len(nodes), "pos": (600, y), "level": "final_boss", "world": worlds + 1,
+                  "theme": LEVEL_THEMES + 1, "level_num": levels_per_world, "is_boss": True})
+    
+    paths = []
+    for i in range(len(nodes) - 1):
+        if nodes[i]["world"] == nodes[i+1]["world"] or (nodes[i]["is_boss"] and nodes[i+1]["world"] == nodes[i]["world"] + 1):
+            paths.append((i, i+1))
+    return nodes, paths
+
+class OverworldMap:
+    """Adjacency lists and screen-height bands of the map, built once so per-frame work ignores map size"""
+    __slots__ = ("nodes", "paths", "neighbors", "bands", "height")
+
+    def __init__(self, nodes, paths):
+        self.nodes = nodes
+        self.paths = paths
+        self.neighbors = [[] for _ in nodes]
+        for start_id, end_id in paths:
+            self.neighbors[start_id].append(end_id)
+            self.neighbors[end_id].append(start_id)
+        for adjacent in self.neighbors:
+            adjacent.sort()
+        
+        self.bands = collections.defaultdict(lambda: ([], []))
+        for node in nodes:
+            y = node["pos"][1]
+            for band in range(self.band(y - OVERWORLD_NODE_RADIUS), self.band(y + OVERWORLD_NODE_RADIUS) + 1):
+                self.bands[band][0].append(node["id"])
+        for path in paths:
+            ys = [nodes[node_id]["pos"][1] for node_id in path]
+            for band in range(self.band(min(ys)), self.band(max(ys)) + 1):
+                self.bands[band][1].append(path)
+        self.height = max(node["pos"][1] for node in nodes) + 2 * OVERWORLD_NODE_RADIUS
+    
+    @staticmethod
+    def band(y):
+        return int(y) // SCREEN_HEIGHT
+    
+    def accessible(self, node_id, completed):
+        """Neighbours the player may walk to: earlier nodes always, later ones once this node is completed"""
+        if completed[node_id]:
+            return self.neighbors[node_id]
+        return [n for n in self.neighbors[node_id] if n <= node_id]
+    
+    def route(self, start, goal, completed):
+        """Fewest-step walk from start to the first node id goal accepts, excluding start; [] if none"""
+        parents = {start: None}
+        frontier = collections.deque([start])
+        while frontier:
+            node_id = frontier.popleft()
+            if node_id != start and goal(node_id):
+                route = []
+                while node_id != start:
+                    route.append(node_id)
+                    node_id = parents[node_id]
+                return route[::-1]
+            for n in self.accessible(node_id, completed):
+                if n not in parents:
+                    parents[n] = node_id
+                    frontier.append(n)
+        return []
+
+@functools.lru_cache(maxsize=None)
+def campaign_map(worlds=5, levels_per_world=4):
+    """The map of a campaign size, built once and shared by every GameWorld playing it"""
+    return OverworldMap(*build_overworld(worlds, levels_per_world))
+
+overworld_map = campaign_map()
+overworld_nodes, overworld_paths = overworld_map.nodes, overworld_map.paths
 
 # Font for text
 font = pygame.font.Font(None, 36)
 small_font = pygame.font.Font(None, 24)
 
+@functools.lru_cache(maxsize=256)
+def render_text(text_font, text, color):
+    """Rasterize a string once and reuse the surface until it falls out of the LRU"""
+    return text_font.render(text, True, color)
+
 # Game loop variables
 clock = pygame.time.Clock()
-FPS = 60
-running = True
-
-# Victory/Defeat screens
-def draw_victory():
-    screen.fill(GREEN)
-    text = font.render("Level Complete!", True, WHITE)
-    screen.blit(text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2))
-    pygame.display.flip()
-
-def draw_game_over():
-    screen.fill(RED)
-    text = font.render("Game Over", True, WHITE)
-    screen.blit(text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2))
-    pygame.display.flip()
-
-def draw_hud():
-    for i in range(player_health):
-        pygame.draw.circle(screen, RED, (30 + i*40, 30), 15)
-    score_text = small_font.render(f"Score: {player_score}", True, WHITE)
-    screen.blit(score_text, (10, 60))
-    lives_text = small_font.render(f"Lives: {player_lives}", True, WHITE)
-    screen.blit(lives_text, (10, 90))
-
-def draw_overworld():
-    screen.fill(BLUE)
-    
-    for start_id, end_id in overworld_paths:
-        if overworld_nodes[start_id]["completed"] or start_id == current_node or (end_id == current_node and overworld_nodes[start_id]["completed"]):
-            start_pos = overworld_nodes[start_id]["pos"]
-            end_pos = overworld_nodes[end_id]["pos"]
-            pygame.draw.line(screen, WHITE, start_pos, end_pos, 5)
-    
-    for node in overworld_nodes:
-        color = GREEN if node["completed"] else RED if node["is_boss"] else GRAY
-        pygame.draw.circle(screen, color, node["pos"], 30)
-        pygame.draw.circle(screen, WHITE, node["pos"], 30, 3)
-        level_text = small_font.render(f"W{node['world']}-{'Boss' if node['is_boss'] else f'L{node['id'] % 4 + 1}'}", True, WHITE)
-        screen.blit(level_text, (node["pos"][0] - 20, node["pos"][1] - 10))
-    
-    pygame.draw.circle(screen, YELLOW, (int(overworld_player_pos[0]), int(overworld_player_pos[1])), OVERWORLD_PLAYER_SIZE)
-    
-    instructions = small_font.render("Arrow Keys: Move | Enter: Select | ESC: Quit", True, WHITE)
-    screen.blit(instructions, (10, 10))
-    
-    world_text = small_font.render(f"World {current_world}", True, WHITE)
-    screen.blit(world_text, (10, 40))
+FPS = 60  # Simulation ticks per second
+TICK = 1 / FPS
+MAX_FRAME_TIME = 0.25  # Longer stalls are dropped instead of replayed tick by tick
 
-def draw_level():
-    screen.fill(BLUE if current_world < 4 else GRAY if current_world == 4 else WHITE)
-    
-    for platform in platforms:
-        color = BROWN if current_world != 4 else LAVA_RED if platform.y == SCREEN_HEIGHT - 60 else GRAY
-        pygame.draw.rect(screen, color, platform)
-    
-    for enemy in enemies:
-        enemy.draw()
-    
-    for pu in power_ups:
-        pu.draw()
-    
-    if not overworld_nodes[current_node]["is_boss"]:
-        pygame.draw.rect(screen, GREEN, level_exit)
-        exit_text = small_font.render("EXIT", True, WHITE)
-        screen.blit(exit_text, (level_exit.centerx - 20, level_exit.centery - 10))
-    
-    pygame.draw.rect(screen, RED, (player_x, player_y, PLAYER_WIDTH, PLAYER_HEIGHT))
-    
-    level_text = font.render(f"World {current_world} - {'Boss' if overworld_nodes[current_node]['is_boss'] else f'Level {current_level_num}'}", True, WHITE)
-    screen.blit(level_text, (10, 10))
-    
-    instructions = small_font.render("Arrows: Move | Space: Jump | ESC: Map", True, WHITE)
-    screen.blit(instructions, (10, 50))
-    
-    draw_hud()
+# Render interpolation between the last two simulation ticks
+interpolate = False
 
-def draw_boss():
-    draw_level()
-    boss.draw()
-    pygame.draw.rect(screen, RED, (SCREEN_WIDTH // 2 - 100, 20, 200, 20))
-    health_width = (boss.health / boss.max_health) * 200
-    pygame.draw.rect(screen, GREEN, (SCREEN_WIDTH // 2 - 100, 20, health_width, 20))
+# Dirty-rect rendering: only areas touched last frame or this frame are redrawn and presented
+dirty_rendering = True
 
-def handle_overworld_input(keys):
-    global current_node, target_node, move_progress, game_state, current_level, platforms, player_x, player_y, player_velocity_y, current_world, boss, enemies, power_ups, current_level_num, invincibility_timer
-    
-    if target_node is None:
-        connected_nodes = [end for start, end in overworld_paths if start == current_node] + [start for start, end in overworld_paths if end == current_node]
-        accessible_nodes = [n for n in connected_nodes if n <= current_node or overworld_nodes[current_node]["completed"]]
-        
-        if keys[pygame.K_RIGHT]:
-            candidates = [node_id for node_id in accessible_nodes if node_id > current_node]
-            if candidates:
-                target_node = min(candidates)
-                move_progress = 0
-        
-        if keys[pygame.K_LEFT]:
-            candidates = [node_id for node_id in accessible_nodes if node_id < current_node]
-            if candidates:
-                target_node = max(candidates)
-                move_progress = 0
-        
-        if keys[pygame.K_RETURN]:
-            node = overworld_nodes[current_node]
-            current_world = node["world"]
-            level_num = node["id"] % 4 + 1 if not node["is_boss"] else 4
-            current_level_num = level_num
-            current_level = node["level"]
-            platforms = get_platforms_for_level(current_world, level_num)
-            
-            # Place exit on last platform for non-boss levels
-            if not node["is_boss"] and platforms:
-                last_platform = max(platforms, key=lambda p: p.right)
-                level_exit.topleft = (min(last_platform.right - 50, SCREEN_WIDTH - 60), last_platform.top - 60)
-            
-            player_x = 50
-            player_y = get_start_y()
-            player_velocity_y = 0
-            invincibility_timer = 0
-            
-            enemies.clear()
-            power_ups.clear()
-            if len(platforms) > 1 and not node["is_boss"]:
-                valid_platforms = [p for p in platforms[1:] if p.y != SCREEN_HEIGHT - 60]
-                if valid_platforms:
-                    enemy_platform = random.choice(valid_platforms)
-                    num_enemies = min(current_world, 3)  # Cap enemies for balance
-                    for i in range(num_enemies):
-                        x = random.randint(enemy_platform.left + 10, enemy_platform.right - 40)
-                        enemies.append(Enemy(x, enemy_platform.top, enemy_platform))
-                    
-                    pu_platform = random.choice(valid_platforms)
-                    x = random.randint(pu_platform.left + 10, pu_platform.right - 30)
-                    y = pu_platform.top - 20
-                    power_ups.append(PowerUp(x, y))
-
-            if node["is_boss"]:
-                game_state = STATE_BOSS
-                boss = BabyBowserBoss() if node["level"] == "final_boss" else KamekBoss(current_world)
+# Static level geometry baked in two-screen tiles, least recently used tiles evicted first
+LEVEL_LAYER_CACHE_SIZE = 8
+
+# Levels wider than the screen scroll with the player; only the columns around the camera are simulated
+ACTIVE_COLUMN = SCREEN_WIDTH // 2
+
+class GameWorld:
+    """One game session: player, level, enemies, bosses, map progress and render caches.
+
+    Nothing here touches module state except the shared read-only caches
+    (level layouts, maps, text), so a process can step any number of worlds
+    side by side. step() advances one fixed tick; render() draws to the display.
+    """
+    __slots__ = ("rng", "running", "game_state", "current_level", "current_world", "current_level_num",
+                 "player_x", "player_y", "player_velocity_y", "is_jumping", "player_health", "player_lives", "player_score",
+                 "invincibility_timer", "prev_player_x", "prev_player_y",
+                 "platforms", "platform_grid", "level_exit", "level_screens", "level_width", "level_left", "level_theme", "level_window",
+                 "enemies", "power_ups", "active_power_ups", "boss", "endless",
+                 "overworld_map", "overworld_nodes", "completed", "overworld_version", "current_node", "target_node", "move_progress",
+                 "travel_route", "overworld_player_pos", "warm_queue", "warm_node",
+                 "transition_screen", "transition_ticks", "transition_next",
+                 "render_alpha", "camera_x", "dirty_rects", "rendered_scene", "level_layers", "overworld_layer", "overworld_layer_key")
+
+    def __init__(self, seed=None, vector_enemies=False, level_screens=1, worlds=5):
+        self.rng = random.Random(seed)
+        self.running = True
+        self.game_state = STATE_OVERWORLD
+        self.current_level = None
+        self.current_world = 1
+        self.current_level_num = None
+
+        self.player_x = 50
+        self.player_y = SCREEN_HEIGHT - PLAYER_HEIGHT - 10
+        self.player_velocity_y = 0
+        self.is_jumping = False
+        self.player_health = 3
+        self.player_lives = 3
+        self.player_score = 0
+        self.invincibility_timer = 0
+        self.prev_player_x = self.player_x
+        self.prev_player_y = self.player_y
+
+        self.platforms = []
+        self.platform_grid = PlatformGrid(self.platforms)
+        self.level_exit = pygame.Rect((SCREEN_WIDTH - 60, SCREEN_HEIGHT - 100), EXIT_SIZE)
+        self.level_screens = level_screens
+        self.level_width = SCREEN_WIDTH
+        self.level_left = 0
+        self.level_theme = 1
+        self.level_window = None
+        self.enemies = make_enemy_group(vector_enemies)
+        self.power_ups = []
+        self.active_power_ups = []
+        self.boss = None
+        self.endless = None  # The endless run in progress, if any
+
+        self.overworld_map = campaign_map(worlds)
+        self.overworld_nodes = self.overworld_map.nodes
+        if len(self.overworld_nodes) > NO_NODE:
+            # Fail up front rather than at the first --save-state or --rewind snapshot
+            raise ValueError(f"a {len(self.overworld_nodes)} node map does not fit state snapshots, which hold at most {NO_NODE}")
+        self.completed = bytearray(len(self.overworld_nodes))
+        self.overworld_version = 0
+        self.current_node = 0
+        self.target_node = None
+        self.move_progress = 0
+        self.travel_route = collections.deque()  # Nodes still to walk through after target_node
+        self.overworld_player_pos = list(self.overworld_nodes[0]["pos"])
+        self.warm_queue = None
+        self.warm_node = None
+
+        # Victory/Defeat screens are timed states counted down by step(), so the loop keeps handling events meanwhile
+        self.transition_screen = None
+        self.transition_ticks = 0
+        self.transition_next = STATE_OVERWORLD
+
+        self.render_alpha = 1.0
+        self.camera_x = 0
+        self.dirty_rects = []
+        self.rendered_scene = None
+        self.level_layers = collections.OrderedDict()
+        # Pre-rendered map bands, rebuilt only when the view's band, current_node or overworld_version changes
+        self.overworld_layer = None
+        self.overworld_layer_key = None
+
+    def complete_node(self, node_id):
+        self.completed[node_id] = 1
+        self.overworld_version += 1
+
+    def warm_level_cache(self):
+        """Generate one level around the player's node per call, so entering or walking to a neighbour is a cache hit"""
+        if self.warm_node != self.current_node:
+            self.warm_node = self.current_node
+            self.warm_queue = iter([self.current_node] + self.overworld_map.neighbors[self.current_node])
+        node_id = next(self.warm_queue, None)
+        if node_id is not None:
+            level_for_node(self.overworld_nodes[node_id], self.level_screens)
+
+    def camera_left(self, x):
+        """Level x at the left edge of the screen when the player is at x"""
+        return max(self.level_left, min(int(x) + PLAYER_WIDTH // 2 - SCREEN_WIDTH // 2, self.level_width - SCREEN_WIDTH))
+
+    def update_level_window(self):
+        """Narrow enemy and power-up updates to half a screen either side of the view, refreshed when the camera changes column"""
+        column = self.camera_left(self.player_x) // ACTIVE_COLUMN
+        window = ((column - 1) * ACTIVE_COLUMN, (column + 4) * ACTIVE_COLUMN)
+        if window != self.level_window:
+            self.level_window = window
+            self.enemies.set_window(*window)
+            self.active_power_ups = [pu for pu in self.power_ups if pu.rect.right > window[0] and pu.rect.left < window[1]]
+
+    def start_endless(self, world=1):
+        """Begin a fresh endless run in world's style"""
+        self.stop_endless()
+        self.endless = EndlessLevel(world)
+        self.game_state = STATE_LEVEL
+        self.current_level = f"endless_{world}"
+        self.current_world = world
+        self.level_theme = (world - 1) % LEVEL_THEMES + 1
+        for key in [key for key in self.level_layers if key[0] == self.current_level]:
+            del self.level_layers[key]
+
+        self.enemies.clear()
+        self.power_ups.clear()
+        self.player_x = self.level_left = 0
+        self.level_width = SCREEN_WIDTH
+        self.update_endless()
+        self.player_x, self.player_y = self.endless.spawn_point()
+        self.player_velocity_y = 0
+        self.invincibility_timer = 0
+        self.player_health = self.player_lives = 3
+        self.player_score = 0
+        self.level_window = None
+        self.update_level_window()
+
+    def restart_endless(self):
+        self.start_endless(self.endless.world)
+
+    def stop_endless(self):
+        if self.endless is not None:
+            self.endless.close()
+            self.endless = None
+
+    def update_endless(self):
+        """Stream chunks in ahead of the camera and out behind it; the level is only rebuilt when they change"""
+        column = self.camera_left(self.player_x) // SCREEN_WIDTH
+        chunks = self.endless.chunks
+        if chunks and chunks[0].index >= column - ENDLESS_BEHIND and chunks[-1].index >= column + ENDLESS_AHEAD:
+            return
+
+        while not chunks or chunks[-1].index < column + ENDLESS_AHEAD:
+            chunk = self.endless.load(chunks[-1].index + 1 if chunks else 0)
+            for x, y, platform in chunk.enemy_spawns:
+                self.enemies.spawn(x, y, platform)
+            for x, y in chunk.power_up_spawns:
+                self.power_ups.append(PowerUp(x, y))
+        while chunks[0].index < column - ENDLESS_BEHIND:
+            chunks.popleft()
+
+        self.level_left = level_left = chunks[0].index * SCREEN_WIDTH
+        self.level_width = (chunks[-1].index + 1) * SCREEN_WIDTH
+        self.enemies.remove([i for i, rect in enumerate(self.enemies.rects()) if rect.right <= level_left])
+        self.power_ups[:] = [pu for pu in self.power_ups if pu.rect.right > level_left]
+        self.platforms = [p for chunk in chunks for p in chunk.platforms]
+        self.platform_grid = PlatformGrid(self.platforms)
+        # Tiles baked while an evicted chunk was live may still show its platforms
+        for key in [key for key in self.level_layers if key[0] == self.current_level and key[1] * SCREEN_WIDTH <= level_left]:
+            del self.level_layers[key]
+        self.level_window = None
+
+    def respawn_position(self):
+        """Where the player reappears after falling or losing a life"""
+        if self.endless is not None:
+            return self.endless.spawn_point()
+        return 50, get_start_y(self.platforms)
+
+    def start_transition(self, message, color, ms, next_state=STATE_OVERWORLD):
+        """Show message for ms of game time, then switch to next_state (None ends the game, a function is called instead)"""
+        self.game_state = STATE_TRANSITION
+        self.transition_screen = (message, color)
+        self.transition_ticks = ms * FPS // 1000
+        self.transition_next = next_state
+
+    def show_victory(self, ms, next_state=STATE_OVERWORLD):
+        self.start_transition("Level Complete!", GREEN, ms, next_state)
+
+    def show_game_over(self):
+        # An endless run starts over instead, so attract mode and soak tests keep going
+        self.start_transition("Game Over", RED, 2000, self.restart_endless if self.endless is not None else STATE_OVERWORLD)
+
+    def update_transition(self):
+        self.transition_ticks -= 1
+        if self.transition_ticks <= 0:
+            if self.transition_next is None:
+                self.running = False
+            elif callable(self.transition_next):
+                self.transition_next()
             else:
-                game_state = STATE_LEVEL
-
-    if target_node is not None:
-        move_progress += 0.02
-        if move_progress >= 1:
-            current_node = target_node
-            overworld_player_pos[0], overworld_player_pos[1] = overworld_nodes[current_node]["pos"]
-            current_world = overworld_nodes[current_node]["world"]
-            target_node = None
+                self.game_state = self.transition_next
+
+    def draw_transition(self):
+        message, color = self.transition_screen
+        screen.fill(color)
+        text = render_text(font, message, WHITE)
+        screen.blit(text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2))
+
+    def hud_sprites(self):
+        entries = [atlas.entry("heart", 15 + i*40, 15) for i in range(self.player_health)]
+        entries.append((render_text(small_font, f"Score: {self.player_score}", WHITE), (10, 60)))
+        entries.append((render_text(small_font, f"Lives: {self.player_lives}", WHITE), (10, 90)))
+        return entries
+
+    def bake_overworld_layer(self, band):
+        """Render paths and nodes of two screen-height bands for the current progress onto a display-format surface"""
+        layer = pygame.Surface((SCREEN_WIDTH, 2 * SCREEN_HEIGHT)).convert()
+        layer.fill(BLUE)
+        top = band * SCREEN_HEIGHT
+        nodes, completed, current_node = self.overworld_nodes, self.completed, self.current_node
+        node_ids = set(self.overworld_map.bands[band][0] + self.overworld_map.bands[band + 1][0])
+        paths = set(self.overworld_map.bands[band][1] + self.overworld_map.bands[band + 1][1])
+
+        for start_id, end_id in sorted(paths):
+            if completed[start_id] or start_id == current_node or (end_id == current_node and completed[start_id]):
+                start_x, start_y = nodes[start_id]["pos"]
+                end_x, end_y = nodes[end_id]["pos"]
+                pygame.draw.line(layer, WHITE, (start_x, start_y - top), (end_x, end_y - top), 5)
+
+        for node in (nodes[node_id] for node_id in sorted(node_ids)):
+            pos = (node["pos"][0], node["pos"][1] - top)
+            color = GREEN if completed[node["id"]] else RED if node["is_boss"] else GRAY
+            pygame.draw.circle(layer, color, pos, OVERWORLD_NODE_RADIUS)
+            pygame.draw.circle(layer, WHITE, pos, OVERWORLD_NODE_RADIUS, 3)
+            level_text = render_text(small_font, f"W{node['world']}-{'Boss' if node['is_boss'] else 'L' + str(node_level_num(node))}", WHITE)
+            layer.blit(level_text, (pos[0] - 20, pos[1] - 10))
+        return layer
+
+    def overworld_view_top(self):
+        """Map y shown at the top of the screen, following the player down tall maps"""
+        return max(0, min(int(self.overworld_player_pos[1]) - SCREEN_HEIGHT // 2, self.overworld_map.height - SCREEN_HEIGHT))
+
+    def draw_overworld(self):
+        view_top = self.overworld_view_top()
+        band = self.overworld_map.band(view_top)
+        layer_key = (band, self.current_node, self.overworld_version)
+        if layer_key != self.overworld_layer_key:
+            self.overworld_layer = self.bake_overworld_layer(band)
+            self.overworld_layer_key = layer_key
+        screen.blit(self.overworld_layer, (0, 0), (0, view_top - band * SCREEN_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT))
+
+        pygame.draw.circle(screen, YELLOW, (int(self.overworld_player_pos[0]), int(self.overworld_player_pos[1]) - view_top), OVERWORLD_PLAYER_SIZE)
+
+        instructions = render_text(small_font, "Arrow Keys: Move | Up: Next Open Level | Enter: Select | ESC: Quit", WHITE)
+        screen.blit(instructions, (10, 10))
+
+        world_text = render_text(small_font, f"World {self.current_world}", WHITE)
+        screen.blit(world_text, (10, 40))
+
+    def player_draw_pos(self):
+        x, y, prev_x, prev_y = self.player_x, self.player_y, self.prev_player_x, self.prev_player_y
+        if not interpolate or abs(x - prev_x) + abs(y - prev_y) > PLAYER_HEIGHT:
+            return x, y
+        return prev_x + (x - prev_x) * self.render_alpha, prev_y + (y - prev_y) * self.render_alpha
+
+    def bake_level_layer(self, tile):
+        """Render the parts of the current level that never move, for two screens from screen tile on, onto a display-format surface"""
+        left = tile * SCREEN_WIDTH
+        area = pygame.Rect(left, 0, min(2 * SCREEN_WIDTH, self.level_width - left), SCREEN_HEIGHT)
+        layer = pygame.Surface(area.size).convert()
+        theme = self.level_theme
+        layer.fill(BLUE if theme < 4 else GRAY if theme == 4 else WHITE)
+
+        for platform in self.platform_grid.overlapping(area):
+            color = BROWN if theme != 4 else LAVA_RED if is_hazard(platform) else GRAY
+            pygame.draw.rect(layer, color, platform.move(-left, 0))
+
+        level_exit = self.level_exit
+        if self.endless is None and not self.overworld_nodes[self.current_node]["is_boss"] and level_exit.colliderect(area):
+            pygame.draw.rect(layer, GREEN, level_exit.move(-left, 0))
+            exit_text = render_text(small_font, "EXIT", WHITE)
+            layer.blit(exit_text, (level_exit.centerx - 20 - left, level_exit.centery - 10))
+        return layer
+
+    def get_level_layer(self, tile):
+        key = (self.current_level, tile)
+        level_layers = self.level_layers
+        layer = level_layers.get(key)
+        if layer is None:
+            layer = level_layers[key] = self.bake_level_layer(tile)
+            if len(level_layers) > LEVEL_LAYER_CACHE_SIZE:
+                level_layers.popitem(last=False)
         else:
-            start = overworld_nodes[current_node]["pos"]
-            end = overworld_nodes[target_node]["pos"]
-            overworld_player_pos[0] = start[0] + (end[0] - start[0]) * move_progress
-            overworld_player_pos[1] = start[1] + (end[1] - start[1]) * move_progress
+            level_layers.move_to_end(key)
+        return layer
 
-def handle_level_input(keys):
-    global player_x, player_y, player_velocity_y, is_jumping, game_state
-    
-    if keys[pygame.K_LEFT]:
-        new_x = player_x - player_speed
-        player_rect = pygame.Rect(new_x, player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
-        if not any(player_rect.colliderect(p) for p in platforms if p.y != SCREEN_HEIGHT - 60):
-            player_x = max(0, new_x)
-    if keys[pygame.K_RIGHT]:
-        new_x = player_x + player_speed
-        player_rect = pygame.Rect(new_x, player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
-        if not any(player_rect.colliderect(p) for p in platforms if p.y != SCREEN_HEIGHT - 60):
-            player_x = min(SCREEN_WIDTH - PLAYER_WIDTH, new_x)
-    if keys[pygame.K_SPACE] and not is_jumping:
-        player_velocity_y = player_jump
-        is_jumping = True
-    if keys[pygame.K_ESCAPE]:
-        game_state = STATE_OVERWORLD
-
-def update_physics():
-    global player_y, player_velocity_y, is_jumping, game_state, player_health, player_lives, player_score, invincibility_timer
-    
-    if invincibility_timer > 0:
-        invincibility_timer -= 1
-    
-    player_velocity_y = min(player_velocity_y + player_gravity, 20)  # Cap falling speed
-    new_y = player_y + player_velocity_y
-    player_rect = pygame.Rect(player_x, new_y, PLAYER_WIDTH, PLAYER_HEIGHT)
-    
-    is_jumping = True
-    for platform in platforms:
-        if player_rect.colliderect(platform) and player_velocity_y > 0 and player_rect.bottom <= platform.top + 10:
-            player_y = platform.top - PLAYER_HEIGHT
-            player_velocity_y = 0
-            is_jumping = False
-            break
-    
-    if is_jumping:
-        player_y = new_y
-    
-    if player_y < 0:
-        player_y = 0
-        player_velocity_y = 0
-    
-    if invincibility_timer <= 0:
-        for enemy in enemies[:]:
-            if player_rect.colliderect(enemy.rect):
-                if player_velocity_y > 0 and player_rect.bottom < enemy.rect.centery:
-                    enemies.remove(enemy)
-                    player_score += 100
+    def draw_level_background(self, area=None):
+        """Draw the parts of a level that never move under the camera, optionally only inside screen area"""
+        tile = self.camera_x // SCREEN_WIDTH
+        offset = self.camera_x - tile * SCREEN_WIDTH
+        if area is None:
+            screen.blit(self.get_level_layer(tile), (0, 0), (offset, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
+        else:
+            screen.blit(self.get_level_layer(tile), area, area.move(offset, 0))
+
+    def draw_level_foreground(self):
+        """Draw everything that can change between frames and return the rects touched"""
+        camera_x = self.camera_x
+        entries = self.enemies.sprites(camera_x)
+        entries.extend(pu.sprite(camera_x) for pu in self.active_power_ups)
+
+        draw_x, draw_y = self.player_draw_pos()
+        entries.append(atlas.entry("player", int(draw_x - camera_x), int(draw_y)))
+
+        kind = 'Endless' if self.endless is not None else 'Boss' if self.overworld_nodes[self.current_node]['is_boss'] else f'Level {self.current_level_num}'
+        entries.append((render_text(font, f"World {self.current_world} - {kind}", WHITE), (10, 10)))
+        entries.append((render_text(small_font, "Arrows: Move | Space: Jump | ESC: Map", WHITE), (10, 50)))
+
+        entries.extend(self.hud_sprites())
+        return screen.blits(entries)
+
+    def draw_boss_foreground(self):
+        boss = self.boss
+        rects = boss.draw()
+        rects.append(screen.fill(RED, (SCREEN_WIDTH // 2 - 100, 20, 200, 20)))
+        health_width = (boss.health / boss.max_health) * 200
+        screen.fill(GREEN, (SCREEN_WIDTH // 2 - 100, 20, health_width, 20))
+        return rects
+
+    def draw_level(self):
+        self.draw_level_background()
+        return self.draw_level_foreground()
+
+    def draw_boss(self):
+        return self.draw_level() + self.draw_boss_foreground()
+
+    def enter_node(self, node_id):
+        """Put the player on node_id and load its level from the start"""
+        self.move_to_node(node_id)
+        node = self.overworld_nodes[node_id]
+        self.current_level_num = node_level_num(node)
+        self.current_level = node["level"]
+        layout = level_for_node(node, self.level_screens)
+        self.platforms = layout.platforms
+        self.platform_grid = layout.grid
+        self.level_width = layout.width
+        self.level_left = 0
+        self.level_theme = node["theme"]
+        self.stop_endless()
+        if layout.exit_pos:
+            self.level_exit.topleft = layout.exit_pos
+        self.rng.setstate(layout.rng_state)
+
+        self.player_x = 50
+        self.player_y = get_start_y(self.platforms)
+        self.player_velocity_y = 0
+        self.invincibility_timer = 0
+
+        self.enemies.clear()
+        self.power_ups.clear()
+        for x, y, platform in layout.enemy_spawns:
+            self.enemies.spawn(x, y, platform)
+        for x, y in layout.power_up_spawns:
+            self.power_ups.append(PowerUp(x, y))
+        self.level_window = None
+        self.update_level_window()
+
+        if node["is_boss"]:
+            self.game_state = STATE_BOSS
+            self.boss = BabyBowserBoss() if node["level"] == "final_boss" else KamekBoss(self.current_world, self.rng)
+        else:
+            self.game_state = STATE_LEVEL
+
+    def handle_overworld_input(self, keys):
+        self.warm_level_cache()
+
+        if self.target_node is None:
+            current_node = self.current_node
+            accessible_nodes = self.overworld_map.accessible(current_node, self.completed)
+
+            if keys[pygame.K_RIGHT]:
+                candidates = [node_id for node_id in accessible_nodes if node_id > current_node]
+                if candidates:
+                    self.target_node = min(candidates)
+                    self.move_progress = 0
+
+            if keys[pygame.K_LEFT]:
+                candidates = [node_id for node_id in accessible_nodes if node_id < current_node]
+                if candidates:
+                    self.target_node = max(candidates)
+                    self.move_progress = 0
+
+            if keys[pygame.K_UP] and self.target_node is None:
+                completed = self.completed
+                self.travel_route.extend(self.overworld_map.route(current_node, lambda node_id: not completed[node_id], completed))
+                if self.travel_route:
+                    self.target_node = self.travel_route.popleft()
+                    self.move_progress = 0
+
+            if keys[pygame.K_RETURN]:
+                self.enter_node(current_node)
+
+        if self.target_node is not None:
+            self.move_progress += 0.02
+            if self.move_progress >= 1:
+                self.move_to_node(self.target_node)
+                self.target_node = self.travel_route.popleft() if self.travel_route else None
+                self.move_progress = 0
+            else:
+                start = self.overworld_nodes[self.current_node]["pos"]
+                end = self.overworld_nodes[self.target_node]["pos"]
+                self.overworld_player_pos[0] = start[0] + (end[0] - start[0]) * self.move_progress
+                self.overworld_player_pos[1] = start[1] + (end[1] - start[1]) * self.move_progress
+
+    def move_to_node(self, node_id):
+        self.current_node = node_id
+        self.overworld_player_pos[0], self.overworld_player_pos[1] = self.overworld_nodes[node_id]["pos"]
+        self.current_world = self.overworld_nodes[node_id]["world"]
+
+    def handle_level_input(self, keys):
+        if keys[pygame.K_LEFT]:
+            new_x = self.player_x - player_speed
+            player_rect = pygame.Rect(new_x, self.player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
+            if not self.platform_grid.any_solid(player_rect):
+                self.player_x = max(self.level_left, new_x)
+        if keys[pygame.K_RIGHT]:
+            new_x = self.player_x + player_speed
+            player_rect = pygame.Rect(new_x, self.player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
+            if not self.platform_grid.any_solid(player_rect):
+                self.player_x = min(self.level_width - PLAYER_WIDTH, new_x)
+        if keys[pygame.K_SPACE] and not self.is_jumping:
+            self.player_velocity_y = player_jump
+            self.is_jumping = True
+        if keys[pygame.K_ESCAPE]:
+            self.game_state = STATE_OVERWORLD
+
+    def update_physics(self):
+        if self.invincibility_timer > 0:
+            self.invincibility_timer -= 1
+
+        self.player_velocity_y = min(self.player_velocity_y + player_gravity, 20)  # Cap falling speed
+        new_y = self.player_y + self.player_velocity_y
+        player_rect = pygame.Rect(self.player_x, new_y, PLAYER_WIDTH, PLAYER_HEIGHT)
+
+        self.is_jumping = True
+        for platform in self.platform_grid.overlapping(player_rect):
+            if self.player_velocity_y > 0 and player_rect.bottom <= platform.top + 10:
+                self.player_y = platform.top - PLAYER_HEIGHT
+                self.player_velocity_y = 0
+                self.is_jumping = False
+                break
+
+        if self.is_jumping:
+            self.player_y = new_y
+
+        if self.player_y < 0:
+            self.player_y = 0
+            self.player_velocity_y = 0
+
+        if self.invincibility_timer <= 0:
+            stomped = []
+            for i, enemy_rect in self.enemies.colliding(player_rect):
+                if self.player_velocity_y > 0 and player_rect.bottom < enemy_rect.centery:
+                    stomped.append(i)
+                    self.player_score += 100
                 else:
-                    player_health -= 1
-                    invincibility_timer = INVINCIBILITY_DURATION
-                    if player_health <= 0:
-                        player_lives -= 1
-                        if player_lives <= 0:
-                            game_state = STATE_OVERWORLD
-                            draw_game_over()
-                            pygame.time.wait(2000)
+                    self.player_health -= 1
+                    self.invincibility_timer = INVINCIBILITY_DURATION
+                    if self.player_health <= 0:
+                        self.player_lives -= 1
+                        if self.player_lives <= 0:
+                            self.show_game_over()
                         else:
-                            player_health = 3
-                            player_x, player_y = 50, get_start_y()
+                            self.player_health = 3
+                            self.player_x, self.player_y = self.respawn_position()
                         break
-    
-    for pu in power_ups[:]:
-        if player_rect.colliderect(pu.rect):
-            if pu.collect():
-                power_ups.remove(pu)
-                player_score += 50
-    
-    if current_world == 4:
-        lava_rect = pygame.Rect(0, SCREEN_HEIGHT - 60, SCREEN_WIDTH, 20)
-        if player_rect.colliderect(lava_rect) and invincibility_timer <= 0:
-            player_health -= 1
-            player_velocity_y = player_jump
-            invincibility_timer = INVINCIBILITY_DURATION
-            if player_health <= 0:
-                player_lives -= 1
-                if player_lives <= 0:
-                    game_state = STATE_OVERWORLD
-                    draw_game_over()
-                    pygame.time.wait(2000)
+            self.enemies.remove(stomped)
+
+        for pu in self.active_power_ups[:]:
+            if player_rect.colliderect(pu.rect):
+                if pu.collect(self):
+                    self.power_ups.remove(pu)
+                    self.active_power_ups.remove(pu)
+                    self.player_score += 50
+
+        if self.invincibility_timer <= 0 and self.platform_grid.any_hazard(player_rect):
+            self.player_health -= 1
+            self.player_velocity_y = player_jump
+            self.invincibility_timer = INVINCIBILITY_DURATION
+            if self.player_health <= 0:
+                self.player_lives -= 1
+                if self.player_lives <= 0:
+                    self.show_game_over()
                 else:
-                    player_health = 3
-                player_x, player_y = 50, get_start_y()
-    
-    if player_y > SCREEN_HEIGHT:
-        if invincibility_timer <= 0:
-            player_health -= 1
-            invincibility_timer = INVINCIBILITY_DURATION
-            if player_health <= 0:
-                player_lives -= 1
-                if player_lives <= 0:
-                    game_state = STATE_OVERWORLD
-                    draw_game_over()
-                    pygame.time.wait(2000)
+                    self.player_health = 3
+                self.player_x, self.player_y = self.respawn_position()
+
+        if self.player_y > SCREEN_HEIGHT:
+            if self.invincibility_timer <= 0:
+                self.player_health -= 1
+                self.invincibility_timer = INVINCIBILITY_DURATION
+                if self.player_health <= 0:
+                    self.player_lives -= 1
+                    if self.player_lives <= 0:
+                        self.show_game_over()
+                    else:
+                        self.player_health = 3
+                self.player_x, self.player_y = self.respawn_position()
+
+        if self.endless is None and not self.overworld_nodes[self.current_node]["is_boss"] and player_rect.colliderect(self.level_exit):
+            self.complete_node(self.current_node)
+            if self.current_node + 1 < len(self.overworld_nodes):
+                self.move_to_node(self.current_node + 1)
+            self.show_victory(1000)
+
+    def update_boss(self):
+        boss = self.boss
+        boss.update()
+        player_rect = pygame.Rect(self.player_x, self.player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
+
+        if player_rect.colliderect(boss.rect) and self.player_velocity_y > 0 and player_rect.bottom < boss.rect.centery:
+            if boss.take_damage():
+                self.complete_node(self.current_node)
+                if self.overworld_nodes[self.current_node]["level"] == "final_boss":
+                    self.show_victory(3000, None)
+                    return
+                if self.current_node + 1 < len(self.overworld_nodes):
+                    self.move_to_node(self.current_node + 1)
+                self.show_victory(2000)
+            self.player_velocity_y = player_jump / 2
+
+        if self.invincibility_timer <= 0:
+            pools = (boss.projectiles, boss.shockwaves) if isinstance(boss, BabyBowserBoss) else (boss.projectiles,)
+            for pool in pools:
+                hits = pool.colliding(player_rect)
+                if hits:
+                    self.player_health -= len(hits)
+                    pool.kill_all(hits)
+                    self.invincibility_timer = INVINCIBILITY_DURATION
+
+            if self.player_health <= 0:
+                self.player_lives -= 1
+                if self.player_lives <= 0:
+                    self.show_game_over()
                 else:
-                    player_health = 3
-            player_x, player_y = 50, get_start_y()
-    
-    if not overworld_nodes[current_node]["is_boss"] and player_rect.colliderect(level_exit):
-        overworld_nodes[current_node]["completed"] = True
-        next_node = current_node + 1 if current_node + 1 < len(overworld_nodes) else current_node
-        if next_node != current_node:
-            current_node = next_node
-            overworld_player_pos[0], overworld_player_pos[1] = overworld_nodes[current_node]["pos"]
-            current_world = overworld_nodes[current_node]["world"]
-        game_state = STATE_OVERWORLD
-        draw_victory()
-        pygame.time.wait(1000)
-
-def update_boss():
-    global game_state, boss, player_health, player_lives, current_node, invincibility_timer
-    
-    boss.update()
-    player_rect = pygame.Rect(player_x, player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
-    
-    if player_rect.colliderect(boss.rect) and player_velocity_y > 0 and player_rect.bottom < boss.rect.centery:
-        if boss.take_damage():
-            overworld_nodes[current_node]["completed"] = True
-            next_node = current_node + 1 if current_node + 1 < len(overworld_nodes) else current_node
-            if current_node == 20:
-                draw_victory()
-                pygame.display.flip()
-                pygame.time.wait(3000)
-                global running
-                running = False
-                return
-            current_node = next_node
-            overworld_player_pos[0], overworld_player_pos[1] = overworld_nodes[current_node]["pos"]
-            current_world = overworld_nodes[current_node]["world"]
-            game_state = STATE_OVERWORLD
-            draw_victory()
-            pygame.display.flip()
-            pygame.time.wait(2000)
-        player_velocity_y = player_jump / 2
-    
-    if invincibility_timer <= 0:
-        for proj in boss.projectiles[:]:
-            if player_rect.colliderect(proj):
-                player_health -= 1
-                boss.projectiles.remove(proj)
-                invincibility_timer = INVINCIBILITY_DURATION
-        
-        if isinstance(boss, BabyBowserBoss):
-            for wave in boss.shockwaves[:]:
-                if player_rect.colliderect(wave):
-                    player_health -= 1
-                    boss.shockwaves.remove(wave)
-                    invincibility_timer = INVINCIBILITY_DURATION
-    
-        if player_health <= 0:
-            player_lives -= 1
-            if player_lives <= 0:
-                game_state = STATE_OVERWORLD
-                draw_game_over()
-                pygame.time.wait(2000)
+                    self.player_health = 3
+                    self.player_x, self.player_y = self.respawn_position()
+                self.invincibility_timer = INVINCIBILITY_DURATION
+
+    def update_enemies(self):
+        self.enemies.update()
+
+    def snapshot(self):
+        """The whole simulation state as bytes in the SNAPSHOT_* layout; render caches are left out"""
+        nodes = self.overworld_nodes
+        parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, LEVEL_GENERATOR_VERSION, nodes[-1]["world"] - 1, nodes[-1]["level_num"],
+                                      self.level_screens, SNAPSHOT_STATES.index(self.game_state))]
+        parts.append(bytes(self.completed))
+        parts.append(SNAPSHOT_MAP.pack(self.current_node, NO_NODE if self.target_node is None else self.target_node, self.move_progress,
+                                       self.overworld_player_pos[0], self.overworld_player_pos[1], len(self.travel_route)))
+        parts.append(pack_array("H", self.travel_route))
+        parts.append(SNAPSHOT_PLAYER.pack(self.player_x, self.player_y, self.player_velocity_y, self.prev_player_x, self.prev_player_y,
+                                          self.is_jumping, self.player_health, self.player_lives, self.player_score, self.invincibility_timer))
+
+        walkers = self.enemies.walkers()
+        window = self.level_window or (0, 0)
+        endless = self.endless
+        chunks = (endless.world, endless.chunks[0].index, endless.chunks[-1].index) if endless is not None else (0, 0, -1)
+        parts.append(SNAPSHOT_LEVEL.pack(self.current_world, self.level_theme, self.current_level_num or 0, self.level_left, self.level_width,
+                                         self.level_exit.x, self.level_exit.y, self.level_window is not None, window[0], window[1],
+                                         len(walkers), len(self.power_ups), *chunks))
+        parts.append(pack_array("i", itertools.chain.from_iterable(walkers)))
+        parts.append(pack_array("i", itertools.chain.from_iterable(pu.rect.topleft for pu in self.power_ups)))
+
+        screen_index = NO_SCREEN if self.transition_screen is None else SNAPSHOT_SCREENS.index(self.transition_screen)
+        next_state = NEXT_OVERWORLD if self.transition_next == STATE_OVERWORLD else NEXT_QUIT if self.transition_next is None else NEXT_RESTART_ENDLESS
+        parts.append(SNAPSHOT_TRANSITION.pack(screen_index, next_state, self.transition_ticks))
+
+        boss = self.boss
+        if boss is None:
+            parts.append(SNAPSHOT_BOSS.pack(BOSS_NONE, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        else:
+            if isinstance(boss, KamekBoss):
+                kind, counters, waves = BOSS_KAMEK, (boss.speed, boss.direction, boss.shoot_timer, boss.teleport_timer), ()
+            else:
+                kind, counters, waves = BOSS_BABY_BOWSER, (boss.phase, boss.attack_timer, 0, 0), tuple(boss.shockwaves)
+            shots = tuple(boss.projectiles)
+            parts.append(SNAPSHOT_BOSS.pack(kind, *boss.rect, boss.max_health, boss.health, *counters, len(shots), len(waves)))
+            parts.append(pack_array("i", itertools.chain.from_iterable(shots)))
+            parts.append(pack_array("i", itertools.chain.from_iterable(waves)))
+
+        _, words, gauss = self.rng.getstate()
+        parts.append(SNAPSHOT_RNG.pack(gauss is not None, gauss or 0.0))
+        parts.append(pack_array("I", words))
+        return b"".join(parts)
+
+    def restore(self, data):
+        """Replace this world's simulation state with a snapshot(); levels are regenerated, not read back"""
+        magic, version, generator_version, worlds, levels_per_world, level_screens, state = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"not a version {SNAPSHOT_VERSION} snapshot")
+        if generator_version != LEVEL_GENERATOR_VERSION:
+            raise ValueError(f"snapshot was taken with level generator v{generator_version}, not v{LEVEL_GENERATOR_VERSION}")
+        overworld_map = campaign_map(worlds, levels_per_world)
+        # Baked layers only depend on the level names and lengths, so rewinding within a session keeps them
+        if overworld_map is not self.overworld_map or level_screens != self.level_screens:
+            self.level_layers.clear()
+        self.overworld_map = overworld_map
+        self.overworld_nodes = nodes = overworld_map.nodes
+        self.level_screens = level_screens
+        self.game_state = SNAPSHOT_STATES[state]
+        offset = SNAPSHOT_HEADER.size
+        completed = data[offset:offset + len(nodes)]
+        if completed != self.completed:
+            self.completed = bytearray(completed)
+            self.overworld_version += 1
+        offset += len(nodes)
+
+        self.current_node, target_node, self.move_progress, map_x, map_y, route_length = SNAPSHOT_MAP.unpack_from(data, offset)
+        self.target_node = None if target_node == NO_NODE else target_node
+        self.overworld_player_pos = [map_x, map_y]
+        route, offset = unpack_array("H", data, offset + SNAPSHOT_MAP.size, route_length)
+        self.travel_route = collections.deque(route)
+        (self.player_x, self.player_y, self.player_velocity_y, self.prev_player_x, self.prev_player_y, self.is_jumping,
+         self.player_health, self.player_lives, self.player_score, self.invincibility_timer) = SNAPSHOT_PLAYER.unpack_from(data, offset)
+        offset += SNAPSHOT_PLAYER.size
+
+        (self.current_world, self.level_theme, level_num, self.level_left, self.level_width, exit_x, exit_y, has_window, window_left, window_right,
+         walker_count, power_up_count, endless_world, first_chunk, last_chunk) = SNAPSHOT_LEVEL.unpack_from(data, offset)
+        self.current_level_num = level_num or None
+        self.level_exit.topleft = (exit_x, exit_y)
+        self.stop_endless()
+        if endless_world:
+            self.endless = EndlessLevel(endless_world)
+            self.endless.chunks.extend(generate_chunk(endless_world, index) for index in range(first_chunk, last_chunk + 1))
+            self.current_level = f"endless_{endless_world}"
+            self.platforms = [p for chunk in self.endless.chunks for p in chunk.platforms]
+            self.platform_grid = PlatformGrid(self.platforms)
+        elif self.game_state in (STATE_LEVEL, STATE_BOSS):
+            node = nodes[self.current_node]
+            layout = level_for_node(node, level_screens)
+            self.current_level = node["level"]
+            self.platforms = layout.platforms
+            self.platform_grid = layout.grid
+        else:
+            self.current_level = None
+            self.platforms = []
+            self.platform_grid = PlatformGrid(self.platforms)
+
+        walkers, offset = unpack_array("i", data, offset + SNAPSHOT_LEVEL.size, 6 * walker_count)
+        self.enemies.load([tuple(walkers[i:i + 6]) for i in range(0, len(walkers), 6)])
+        positions, offset = unpack_array("i", data, offset, 2 * power_up_count)
+        self.power_ups = [PowerUp(positions[i], positions[i + 1]) for i in range(0, len(positions), 2)]
+        if has_window:
+            self.level_window = (window_left, window_right)
+            self.enemies.set_window(window_left, window_right)
+            self.active_power_ups = [pu for pu in self.power_ups if pu.rect.right > window_left and pu.rect.left < window_right]
+        else:
+            self.level_window = None
+            self.enemies.set_window(*UNBOUNDED_WINDOW)
+            self.active_power_ups = []
+
+        screen_index, next_state, self.transition_ticks = SNAPSHOT_TRANSITION.unpack_from(data, offset)
+        self.transition_screen = None if screen_index == NO_SCREEN else SNAPSHOT_SCREENS[screen_index]
+        self.transition_next = (STATE_OVERWORLD, None, self.restart_endless)[next_state]
+        offset += SNAPSHOT_TRANSITION.size
+
+        kind, x, y, width, height, max_health, health, a, b, c, d, shot_count, wave_count = SNAPSHOT_BOSS.unpack_from(data, offset)
+        offset += SNAPSHOT_BOSS.size
+        self.boss = None
+        if kind != BOSS_NONE:
+            if kind == BOSS_KAMEK:
+                boss = KamekBoss(self.current_world, self.rng)
+                boss.speed, boss.direction, boss.shoot_timer, boss.teleport_timer = a, b, c, d
+                pools = (boss.projectiles,)
             else:
-                player_health = 3
-                player_x, player_y = 50, get_start_y()
-            invincibility_timer = INVINCIBILITY_DURATION
+                boss = BabyBowserBoss()
+                boss.phase, boss.attack_timer = a, b
+                pools = (boss.projectiles, boss.shockwaves)
+            boss.rect.update(x, y, width, height)
+            boss.max_health, boss.health = max_health, health
+            for pool, count in zip(pools, (shot_count, wave_count)):
+                rects, offset = unpack_array("i", data, offset, 4 * count)
+                for i in range(0, len(rects), 4):
+                    pool.spawn(*rects[i:i + 4])
+            self.boss = boss
+
+        has_gauss, gauss = SNAPSHOT_RNG.unpack_from(data, offset)
+        words, offset = unpack_array("I", data, offset + SNAPSHOT_RNG.size, 625)
+        self.rng.setstate((3, tuple(words), gauss if has_gauss else None))
+
+        self.warm_node = None
+        self.dirty_rects = []
+        self.rendered_scene = None
+        return self
+
+    def step(self, keys):
+        """Advance the game by exactly one fixed tick on a key mapping or an INPUT_KEYS bit mask"""
+        if isinstance(keys, int):
+            keys = mask_to_keys(keys)
+        self.prev_player_x, self.prev_player_y = self.player_x, self.player_y
+
+        game_state = self.game_state
+        if game_state == STATE_OVERWORLD:
+            self.handle_overworld_input(keys)
+        elif game_state == STATE_LEVEL:
+            self.handle_level_input(keys)
+            self.update_physics()
+            if self.endless is not None:
+                self.update_endless()
+            self.update_level_window()
+            self.update_enemies()
+        elif game_state == STATE_BOSS:
+            self.handle_level_input(keys)
+            self.update_physics()
+            self.update_boss()
+        elif game_state == STATE_TRANSITION:
+            self.update_transition()
+
+    def render_dirty(self):
+        """Erase last frame's sprites from the background and redraw; returns the rects to present"""
+        scene = (self.game_state, self.current_level, self.camera_x)
+        if scene != self.rendered_scene:
+            self.draw_level_background()
+            erased = [screen.get_rect()]
+            self.rendered_scene = scene
+        else:
+            for rect in self.dirty_rects:
+                self.draw_level_background(rect)
+            erased = self.dirty_rects
+
+        rects = self.draw_level_foreground()
+        if self.game_state == STATE_BOSS:
+            rects.extend(self.draw_boss_foreground())
+        self.dirty_rects = rects
+        return erased + rects
+
+    def render(self):
+        game_state = self.game_state
+        if game_state in (STATE_LEVEL, STATE_BOSS):
+            self.camera_x = self.camera_left(self.player_draw_pos()[0])
+        if game_state in (STATE_LEVEL, STATE_BOSS) and dirty_rendering:
+            rects = self.render_dirty()
+        else:
+            rects = None
+            if game_state == STATE_OVERWORLD:
+                self.draw_overworld()
+            elif game_state == STATE_LEVEL:
+                self.draw_level()
+            elif game_state == STATE_BOSS:
+                self.draw_boss()
+            elif game_state == STATE_TRANSITION:
+                self.draw_transition()
+            self.rendered_scene = None
+
+        if profiler is not None and profiler.overlay:
+            overlay_rect = profiler.draw(screen)
+            if rects is not None:
+                rects.append(overlay_rect)
+                self.dirty_rects.append(overlay_rect)
+        present(rects)
+
+# Input recording and replay
+INPUT_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_SPACE, pygame.K_RETURN, pygame.K_ESCAPE, pygame.K_UP)
+REPLAY_MAGIC = b"SMWR"
+REPLAY_VERSION = 3
+# magic, format version, level generator version, RNG seed, ticks, level screens, endless world (0 for none), map worlds, vector enemies
+REPLAY_HEADER = struct.Struct("<4sBBIIHBH?")
+REPLAY_RUN = struct.Struct("<BH")  # input mask, ticks it was held
+
+def keys_to_mask(keys):
+    mask = 0
+    for bit, key in enumerate(INPUT_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+def mask_to_keys(mask):
+    return collections.defaultdict(bool, {key: True for bit, key in enumerate(INPUT_KEYS) if mask >> bit & 1})
+
+Replay = collections.namedtuple("Replay", "seed masks level_screens endless worlds vector_enemies")
+
+class InputRecorder:
+    """Collects one input mask per simulation tick and saves them run-length encoded, with the modes the session started in"""
+    def __init__(self, path, seed, level_screens=1, endless=0, worlds=5, vector_enemies=False):
+        self.path = path
+        self.seed = seed
+        self.modes = (level_screens, endless, worlds, vector_enemies)
+        self.masks = bytearray()
+
+    def record(self, keys):
+        self.masks.append(keys_to_mask(keys))
+
+    def save(self):
+        with open(self.path, "wb") as f:
+            f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, LEVEL_GENERATOR_VERSION, self.seed, len(self.masks), *self.modes))
+            for mask, run in itertools.groupby(self.masks):
+                held = sum(1 for _ in run)
+                while held:
+                    chunk = min(held, 0xFFFF)
+                    f.write(REPLAY_RUN.pack(mask, chunk))
+                    held -= chunk
+
+def load_replay(path):
+    """Return a Replay: the recording's seed, per-tick input masks and game modes"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < REPLAY_HEADER.size or (len(data) - REPLAY_HEADER.size) % REPLAY_RUN.size:
+        raise ValueError(f"{path} is truncated")
+    magic, version, generator_version, seed, ticks, *modes = REPLAY_HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay")
+    if generator_version != LEVEL_GENERATOR_VERSION:
+        print(f"Warning: {path} was recorded with level generator v{generator_version}, replay may diverge")
+    masks = bytearray()
+    for mask, held in REPLAY_RUN.iter_unpack(data[REPLAY_HEADER.size:]):
+        masks.extend(bytes((mask,)) * held)
+    if len(masks) != ticks:
+        raise ValueError(f"{path} is truncated: {len(masks)} of {ticks} ticks")
+    return Replay(seed, masks, *modes)
+
+def replay_world(replay):
+    """A fresh GameWorld in the state the recording started from"""
+    world = GameWorld(replay.seed, replay.vector_enemies, replay.level_screens, replay.worlds)
+    if replay.endless:
+        world.start_endless(replay.endless)
+    return world
+
+# State snapshots: fixed-size sections, then the arrays whose lengths they record, all little-endian
+SNAPSHOT_MAGIC = b"SMWS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sBBHBHB")  # magic, format version, level generator version, map worlds, levels per world, level screens, game state
+SNAPSHOT_MAP = struct.Struct("<HHdddH")  # current node, target node (NO_NODE for none), move progress, map x, map y, route length
+SNAPSHOT_PLAYER = struct.Struct("<iddid?hhIh")  # x, y, vertical speed, previous x, previous y, jumping, health, lives, score, invincibility
+SNAPSHOT_LEVEL = struct.Struct("<HBHiiii?iiHHHii")  # world, theme, level number, left edge, width, exit x, exit y, has window, window left, window right, walkers, power-ups, endless world (0 for none), first and last chunk
+SNAPSHOT_TRANSITION = struct.Struct("<BBi")  # screen, next state, ticks left
+SNAPSHOT_BOSS = struct.Struct("<BiiiihhhhhhHH")  # kind, rect, max health, health, four counters, shots, shockwaves
+SNAPSHOT_RNG = struct.Struct("<?d")  # whether a gauss() value is cached, the value; 625 state words follow
+SNAPSHOT_STATES = (STATE_OVERWORLD, STATE_LEVEL, STATE_BOSS, STATE_TRANSITION)
+SNAPSHOT_SCREENS = (("Level Complete!", GREEN), ("Game Over", RED))
+NO_SCREEN = 0xFF
+NO_NODE = 0xFFFF  # Node ids are unsigned shorts, so a snapshot map holds at most NO_NODE nodes
+NEXT_OVERWORLD, NEXT_QUIT, NEXT_RESTART_ENDLESS = 0, 1, 2
+BOSS_NONE, BOSS_KAMEK, BOSS_BABY_BOWSER = 0, 1, 2
+
+def pack_array(typecode, values):
+    return array.array(typecode, values).tobytes()
+
+def unpack_array(typecode, data, offset, count):
+    """count items of typecode from data at offset, and the offset just past them"""
+    values = array.array(typecode)
+    values.frombytes(data[offset:offset + count * values.itemsize])
+    return values, offset + count * values.itemsize
+
+# Rewind: per-tick snapshots in one preallocated arena, stored as zlib-packed XOR deltas against the tick before,
+# with a whole keyframe every second so any tick decodes in a bounded number of steps
+REWIND_KEYFRAME_INTERVAL = FPS
+REWIND_BUDGET = 1 << 20
+
+def xor_bytes(a, b):
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+class RewindBuffer:
+    """Ring of the last `frames` snapshots within `budget` bytes; the oldest are dropped first when either runs out"""
+    __slots__ = ("arena", "offsets", "lengths", "keyframes", "first", "count", "head", "oldest", "newest", "since_keyframe")
+
+    def __init__(self, frames=FPS * 10, budget=REWIND_BUDGET):
+        self.arena = bytearray(budget)
+        self.offsets = array.array("I", bytes(4 * frames))
+        self.lengths = array.array("I", bytes(4 * frames))
+        self.keyframes = bytearray(frames)  # 1 where the entry is a whole snapshot rather than a delta
+        self.first = 0
+        self.count = 0
+        self.head = 0  # Arena offset just past the newest entry
+        # The oldest and newest ticks decoded: dropping the oldest entry turns the next one whole in one step,
+        # so no delta ever loses its base, and pushing or rewinding only touches the newest
+        self.oldest = None
+        self.newest = None
+        self.since_keyframe = 0
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, index):
+        return (self.first + index) % len(self.offsets)
+
+    def _record(self, index):
+        slot = self._slot(index)
+        offset = self.offsets[slot]
+        return zlib.decompress(self.arena[offset:offset + self.lengths[slot]])
+
+    def _drop_oldest(self):
+        if self.count > 1:
+            record = self._record(1)
+            self.oldest = record if self.keyframes[self._slot(1)] else xor_bytes(record, self.oldest)
+        else:
+            self.oldest = None
+        self.first = self._slot(1)
+        self.count -= 1
+
+    def _keyframe_index(self, index):
+        """Nearest entry at or before index that decodes on its own; the oldest always does"""
+        while index > 0 and not self.keyframes[self._slot(index)]:
+            index -= 1
+        return index
+
+    def push(self, snapshot):
+        """Append the newest tick's snapshot, evicting old ticks until it fits"""
+        key = self.count == 0 or self.since_keyframe >= REWIND_KEYFRAME_INTERVAL or len(snapshot) != len(self.newest)
+        record = zlib.compress(snapshot if key else xor_bytes(snapshot, self.newest), 1)
+        if len(record) > len(self.arena):
+            raise ValueError(f"a {len(record)} byte rewind record does not fit the {len(self.arena)} byte budget")
+        if self.count == len(self.offsets):
+            self._drop_oldest()
+        start = self.head
+        if start + len(record) > len(self.arena):
+            # Wrap to the arena's start; the entries left in its tail are the oldest, so they go first
+            start = 0
+            while self.count and self.offsets[self.first] >= self.head:
+                self._drop_oldest()
+        while self.count and start <= self.offsets[self.first] < start + len(record):
+            self._drop_oldest()
+        if self.count == 0:
+            start = 0
+            if not key:
+                key = True
+                record = zlib.compress(snapshot, 1)
+            self.oldest = snapshot
+
+        end = start + len(record)
+        self.arena[start:end] = record
+        slot = self._slot(self.count)
+        self.offsets[slot] = start
+        self.lengths[slot] = len(record)
+        self.keyframes[slot] = key
+        self.count += 1
+        self.head = end
+        self.newest = snapshot
+        self.since_keyframe = 1 if key else self.since_keyframe + 1
+
+    def frame(self, index):
+        """Snapshot of a buffered tick, 0 being the oldest and -1 the newest"""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("rewind frame out of range")
+        key_index = self._keyframe_index(index)
+        snapshot = self.oldest if key_index == 0 else self._record(key_index)
+        for i in range(key_index + 1, index + 1):
+            snapshot = xor_bytes(self._record(i), snapshot)
+        return snapshot
+
+    def rewind(self):
+        """Drop the newest tick and return the snapshot of the one before it, which becomes the newest"""
+        if self.count < 2:
+            raise IndexError("nothing to rewind to")
+        last = self.count - 1
+        if self.keyframes[self._slot(last)]:
+            self.newest = self.frame(last - 1)
+        else:
+            self.newest = xor_bytes(self._record(last), self.newest)
+        self.count = last
+        newest = self._slot(last - 1)
+        self.head = self.offsets[newest] + self.lengths[newest]
+        self.since_keyframe = last - self._keyframe_index(last - 1)
+        return self.newest
+
+def save_state(world, path):
+    with open(path, "wb") as f:
+        f.write(world.snapshot())
+
+def load_state(world, path):
+    with open(path, "rb") as f:
+        return world.restore(f.read())
+
+def play_tick(world, keys, frame, replay=None, recorder=None, rewind=None):
+    """Run one simulation tick on the given keys, or on the replay's keys when one is loaded; holding Backspace steps back instead"""
+    if rewind is not None and keys[pygame.K_BACKSPACE] and len(rewind) > 1:
+        world.restore(rewind.rewind())
+        return
+    if replay is not None:
+        keys = mask_to_keys(replay[frame])
+    if recorder is not None:
+        recorder.record(keys)
+    world.step(keys)
+    if rewind is not None:
+        rewind.push(world.snapshot())
+
+def autoplay_keys(world, frame):
+    """Key state for headless runs: enter every level, run right and hop"""
+    keys = collections.defaultdict(bool)
+    if world.game_state == STATE_OVERWORLD:
+        keys[pygame.K_RETURN] = True
+    else:
+        keys[pygame.K_RIGHT] = True
+        keys[pygame.K_SPACE] = frame % 45 == 0
+    return keys
+
+def present(rects=None):
+    if rects is None:
+        pygame.display.flip()
+    else:
+        pygame.display.update(rects)
+
+# Hot-path profiling; GameWorld methods and module functions are only wrapped once a Profiler instruments them
+PROFILED_FUNCTIONS = ("handle_overworld_input", "handle_level_input", "update_physics", "update_enemies", "update_boss",
+                      "draw_overworld", "draw_level_background", "draw_level_foreground", "draw_boss_foreground", "present")
+PROFILE_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16)
+profiler = None
+
+class Profiler:
+    """Per-frame time spent in each hot-path function: rolling windows for the overlay, histograms for the dump"""
+    def __init__(self, path, window=120):
+        self.path = path
+        self.frames = 0
+        self.frame = dict.fromkeys(PROFILED_FUNCTIONS, 0.0)
+        self.calls = dict.fromkeys(PROFILED_FUNCTIONS, 0)
+        self.totals = dict.fromkeys(PROFILED_FUNCTIONS, 0.0)
+        self.worst = dict.fromkeys(PROFILED_FUNCTIONS, 0.0)
+        self.recent = {name: collections.deque(maxlen=window) for name in PROFILED_FUNCTIONS}
+        self.histograms = {name: [0] * (len(PROFILE_BUCKETS_MS) + 1) for name in PROFILED_FUNCTIONS}
+        self.overlay = False
+        self.overlay_surface = None
+        self.font = None  # Looked up on first draw, so runs that never show the overlay skip the font search
+
+    def instrument(self, *targets):
+        """Wrap each profiled name on the first target (a class or module) that defines it"""
+        for name in PROFILED_FUNCTIONS:
+            target = next(target for target in targets if hasattr(target, name))
+            setattr(target, name, self._timed(name, getattr(target, name)))
+
+    def _timed(self, name, func):
+        frame, calls, perf_counter = self.frame, self.calls, time.perf_counter
+        @functools.wraps(func)
+        def wrapper(*args):
+            start = perf_counter()
+            result = func(*args)
+            frame[name] += perf_counter() - start
+            calls[name] += 1
+            return result
+        return wrapper
+
+    def end_frame(self):
+        self.frames += 1
+        for name, seconds in self.frame.items():
+            ms = seconds * 1000
+            self.frame[name] = 0.0
+            self.totals[name] += ms
+            self.worst[name] = max(self.worst[name], ms)
+            self.recent[name].append(ms)
+            self.histograms[name][bisect.bisect_left(PROFILE_BUCKETS_MS, ms)] += 1
+
+    def draw(self, surface):
+        """Blit the breakdown in the top-right corner; the text is re-rendered twice a second"""
+        if self.overlay_surface is None or self.frames % 30 == 0:
+            lines = [f"{name:<24}{sum(ms) / max(1, len(ms)):7.3f}{max(ms, default=0):8.3f}" for name, ms in self.recent.items()]
+            lines.insert(0, f"{'ms per frame':<24}{'mean':>7}{'max':>8}")
+            self.overlay_surface = pygame.Surface((330, 18 * len(lines) + 8))
+            self.overlay_surface.fill(BLACK)
+            self.overlay_surface.set_alpha(200)
+            if self.font is None:
+                self.font = pygame.font.SysFont("monospace", 14)
+            for i, line in enumerate(lines):
+                self.overlay_surface.blit(self.font.render(line, True, WHITE), (6, 4 + 18 * i))
+        return surface.blit(self.overlay_surface, (SCREEN_WIDTH - self.overlay_surface.get_width() - 10, 10))
+
+    def dump(self):
+        sections = {}
+        for name in PROFILED_FUNCTIONS:
+            sections[name] = {
+                "calls": self.calls[name],
+                "total_ms": round(self.totals[name], 3),
+                "mean_ms_per_frame": round(self.totals[name] / max(1, self.frames), 4),
+                "max_ms": round(self.worst[name], 3),
+                "histogram": self.histograms[name],
+            }
+        with open(self.path, "w") as f:
+            json.dump({"frames": self.frames, "buckets_ms": list(PROFILE_BUCKETS_MS), "sections": sections}, f, indent=2)
 
 # Main game loop
-async def main():
-    global running, game_state, boss, overworld_player_pos
-    
-    overworld_player_pos = list(overworld_nodes[current_node]["pos"])
+async def main(world, headless=HEADLESS, max_frames=None, render_fps=FPS, replay=None, recorder=None, state_path=None, rewind=None):
+    frame = 0
+    start_time = time.perf_counter()
+    previous_time = start_time
+    accumulator = 0.0
     
-    while running:
+    while world.running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                running = False
+                world.running = False
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE and game_state == STATE_OVERWORLD:
-                    running = False
-        
-        keys = pygame.key.get_pressed()
+                if event.key == pygame.K_ESCAPE and world.game_state == STATE_OVERWORLD:
+                    world.running = False
+                elif event.key == pygame.K_F3 and profiler is not None:
+                    profiler.overlay = not profiler.overlay
+                elif event.key == pygame.K_F5 and state_path is not None:
+                    save_state(world, state_path)
         
-        if game_state == STATE_OVERWORLD:
-            handle_overworld_input(keys)
-            draw_overworld()
-        elif game_state == STATE_LEVEL:
-            handle_level_input(keys)
-            update_physics()
-            for enemy in enemies:
-                enemy.update()
-            draw_level()
-        elif game_state == STATE_BOSS:
-            handle_level_input(keys)
-            update_physics()
-            update_boss()
-            if running:
-                draw_boss()
+        if headless:
+            play_tick(world, autoplay_keys(world, frame), frame, replay, recorder, rewind)
+            frame += 1
+        else:
+            now = time.perf_counter()
+            accumulator += min(now - previous_time, MAX_FRAME_TIME)
+            previous_time = now
+            keys = pygame.key.get_pressed()
+            while accumulator >= TICK and world.running and (max_frames is None or frame < max_frames):
+                play_tick(world, keys, frame, replay, recorder, rewind)
+                accumulator -= TICK
+                frame += 1
+            if world.running:
+                world.render_alpha = accumulator / TICK
+                world.render()
+            clock.tick(render_fps)
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        if profiler is not None:
+            profiler.end_frame()
+        if max_frames is not None and frame >= max_frames:
+            world.running = False
         await asyncio.sleep(0)
     
+    if headless:
+        elapsed = time.perf_counter() - start_time
+        print(f"Simulated {frame} frames in {elapsed:.2f}s: {frame / elapsed:.0f} FPS, {frame / FPS / elapsed:.0f}x real time")
+    if recorder is not None:
+        recorder.save()
+    if state_path is not None:
+        save_state(world, state_path)
+    if profiler is not None:
+        profiler.dump()
+    
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless", action="store_true", help="dummy video driver, no drawing, run uncapped")
+    parser.add_argument("--frames", type=int, help="stop after this many simulation ticks (headless default: one hour of gameplay)")
+    parser.add_argument("--render-fps", type=int, default=FPS, help="cap on rendered frames per second, 0 renders as often as the host allows")
+    parser.add_argument("--interpolate", action="store_true", help="interpolate the player between simulation ticks when rendering")
+    parser.add_argument("--seed", type=int, help="seed for the game's RNG (random when omitted)")
+    parser.add_argument("--record", metavar="PATH", help="save per-tick input and the RNG seed to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="play back a recording instead of reading the keyboard")
+    parser.add_argument("--profile", metavar="PATH", help="time hot-path functions every frame (F3 toggles an overlay) and dump stats to PATH on exit")
+    parser.add_argument("--check-levels", action="store_true", help="report campaign levels whose exit cannot be reached, then quit")
+    parser.add_argument("--vector-enemies", action="store_true", help="update and collide walkers with NumPy arrays (needs numpy)")
+    parser.add_argument("--level-screens", type=int, default=1, metavar="N", help="make every non-boss level N screens long, scrolling with the player")
+    parser.add_argument("--endless", type=int, nargs="?", const=1, metavar="WORLD", help="skip the map and run an endless level in WORLD's style (default 1)")
+    parser.add_argument("--overworld-worlds", type=int, metavar="N", help="play a generated map of N worlds instead of the five-world campaign")
+    parser.add_argument("--full-redraw", action="store_true", help="redraw and flip the whole screen every frame instead of dirty rects")
+    parser.add_argument("--load-state", metavar="PATH", help="resume from a binary state snapshot instead of a new game")
+    parser.add_argument("--save-state", metavar="PATH", help="snapshot the game state to PATH on F5 and on exit")
+    parser.add_argument("--rewind", type=float, metavar="SECONDS", help=f"keep up to SECONDS of play in a {REWIND_BUDGET >> 10} KB buffer; hold Backspace to rewind")
+    args = parser.parse_args()
+    if args.rewind and (args.record or args.replay):
+        parser.error("--rewind cannot be combined with --record or --replay, rewound ticks would not reproduce")
+    worlds = args.overworld_worlds or 5
+    if args.check_levels:
+        report_unreachable_levels(campaign_map(worlds).nodes, args.level_screens)
+        sys.exit()
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+    replay = None
+    if args.replay:
+        replay = load_replay(args.replay)
+        args.frames = len(replay.masks) if args.frames is None else min(args.frames, len(replay.masks))
+    recorder = InputRecorder(args.record, seed, args.level_screens, args.endless or 0, worlds, args.vector_enemies) if args.record else None
+    if HEADLESS and args.frames is None:
+        args.frames = FPS * 60 * 60
+    interpolate = args.interpolate
+    dirty_rendering = not args.full_redraw
+    if args.profile:
+        profiler = Profiler(args.profile)
+        profiler.instrument(GameWorld, sys.modules[__name__])
+    if replay is not None:
+        # The recording's own modes win over the command line, or it would replay into a different game
+        world = replay_world(replay)
+    else:
+        world = GameWorld(seed, args.vector_enemies, args.level_screens, worlds)
+    if args.load_state:
+        load_state(world, args.load_state)
+    elif args.endless and replay is None:
+        world.start_endless(args.endless)
+    rewind = None
+    if args.rewind:
+        rewind = RewindBuffer(max(2, round(args.rewind * FPS)))
+        rewind.push(world.snapshot())
+    asyncio.run(main(world, max_frames=args.frames, render_fps=args.render_fps, replay=replay.masks if replay is not None else None, recorder=recorder,
+                     state_path=args.save_state, rewind=rewind))
@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import time
+import concurrent.futures
+
+# The game module opens a display at import; keep tools, workers and tests off the screen and stdout clean
+os.environ.setdefault("SMW_HEADLESS", "1")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import grokmario4k as game
+
+def chunks(first, count, size):
+    """(start, count) pieces of first..first+count, at most size long"""
+    for start in range(first, first + count, size):
+        yield start, min(size, first + count - start)
+
+def add_pool_arguments(parser, out, record, unit):
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default=out, help=f"packed {record.format} records, one per {unit}")
+    parser.add_argument("--summary", help="write summary JSON here instead of stdout")
+
+def run_pool(task, tasks, workers, paths, summarize):
+    """Map task over tasks in a process pool and return the seconds taken.
+
+    Each task returns one byte string per path, written there in task order
+    (None paths are skipped); summarize sees every first byte string as it
+    arrives. Flat bytes cost workers one buffer copy instead of pickling objects.
+    """
+    start_time = time.perf_counter()
+    files = [open(path, "wb") if path else None for path in paths]
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            for result in pool.map(task, tasks):
+                for f, data in zip(files, result):
+                    if f is not None:
+                        f.write(data)
+                summarize(result[0])
+    finally:
+        for f in files:
+            if f is not None:
+                f.close()
+    return time.perf_counter() - start_time
+
+def report(summary, path, line):
+    """Summary JSON to path or stdout, and a one-line rate to stderr"""
+    if path:
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    print(line, file=sys.stderr)
@@ -0,0 +1,86 @@
+import random
+import struct
+import argparse
+
+import headless
+from headless import game
+
+# node, episode seed, ticks played, outcome, score, lives left
+EPISODE = struct.Struct("<HIIBIB")
+CLEARED, GAME_OVER, TIMED_OUT = 0, 1, 2
+OUTCOMES = ("cleared", "game_over", "timed_out")
+ACTIONS = (0, 1, 2, 4, 2 | 4, 1 | 4)  # Idle, left, right, jump, right+jump, left+jump as INPUT_KEYS masks
+ACTION_WEIGHTS = (1, 1, 4, 1, 3, 1)
+HOLD_TICKS = 8  # A sampled action is held this long, so hops and runs carry somewhere
+
+def episode_seed(node, index):
+    """Seed of a level's index-th episode, stable across runs, worker counts and chunk sizes"""
+    return game.level_seed(f"{node['level']}_{index}")
+
+def play_episode(node_id, seed, max_ticks, actions=None):
+    """Play node_id from the map in a fresh world under a seeded random policy; appends each tick's mask to actions if given"""
+    world = game.GameWorld(seed)
+    world.enter_node(node_id)
+    rng = random.Random(seed)
+    mask = 0
+    ticks = 0
+    while ticks < max_ticks and world.game_state in (game.STATE_LEVEL, game.STATE_BOSS):
+        if ticks % HOLD_TICKS == 0:
+            mask = rng.choices(ACTIONS, ACTION_WEIGHTS)[0]
+        world.step(mask)
+        if actions is not None:
+            actions.append(mask)
+        ticks += 1
+    if world.completed[node_id]:
+        outcome = CLEARED
+    elif world.player_lives <= 0:
+        outcome = GAME_OVER
+    else:
+        outcome = TIMED_OUT
+    return EPISODE.pack(node_id, seed, ticks, outcome, world.player_score, max(0, world.player_lives))
+
+def rollout_chunk(task):
+    """Episodes first..first+count of one node, as packed EPISODE records plus their concatenated action masks"""
+    node_id, first, count, max_ticks, keep_actions = task
+    node = game.overworld_nodes[node_id]
+    records = bytearray()
+    actions = bytearray() if keep_actions else None
+    for index in range(first, first + count):
+        records += play_episode(node_id, episode_seed(node, index), max_ticks, actions)
+    return bytes(records), bytes(actions or b"")
+
+def summarize(stats, records):
+    for node_id, seed, ticks, outcome, score, lives in EPISODE.iter_unpack(records):
+        entry = stats.setdefault(game.overworld_nodes[node_id]["level"], {"episodes": 0, "ticks": 0, "score": 0, **dict.fromkeys(OUTCOMES, 0)})
+        entry["episodes"] += 1
+        entry["ticks"] += ticks
+        entry["score"] += score
+        entry[OUTCOMES[outcome]] += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Play seeded random-policy episodes of every campaign level across a process pool")
+    parser.add_argument("--episodes", type=int, default=200, help="episodes per level")
+    parser.add_argument("--first-episode", type=int, default=0)
+    parser.add_argument("--chunk", type=int, default=25, help="episodes per worker task")
+    parser.add_argument("--max-ticks", type=int, default=game.FPS * 60, help="ticks before an episode counts as timed out")
+    parser.add_argument("--nodes", type=int, nargs="*", help="map nodes to play (default: all)")
+    parser.add_argument("--actions", metavar="PATH", help="also write every episode's per-tick input masks, back to back in record order")
+    headless.add_pool_arguments(parser, "rollouts.bin", EPISODE, "episode")
+    args = parser.parse_args()
+
+    nodes = args.nodes if args.nodes else [node["id"] for node in game.overworld_nodes]
+    tasks = [(node_id, first, count, args.max_ticks, args.actions is not None) for node_id in nodes
+             for first, count in headless.chunks(args.first_episode, args.episodes, args.chunk)]
+    stats = {}
+    elapsed = headless.run_pool(rollout_chunk, tasks, args.workers, [args.out, args.actions], lambda records: summarize(stats, records))
+
+    for entry in stats.values():
+        entry["mean_score"] = round(entry.pop("score") / entry["episodes"], 2)
+        entry["mean_ticks"] = round(entry["ticks"] / entry["episodes"], 1)
+    ticks = sum(entry.pop("ticks") for entry in stats.values())
+    episodes = sum(entry["episodes"] for entry in stats.values())
+    summary = {"episodes": episodes, "ticks": ticks, "seconds": round(elapsed, 3), "workers": args.workers, "levels": stats}
+    headless.report(summary, args.summary, f"{episodes} episodes, {ticks} ticks in {elapsed:.2f}s ({ticks / elapsed:.0f} ticks/s)")
+
+if __name__ == "__main__":
+    main()
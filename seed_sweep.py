@@ -0,0 +1,70 @@
+import random
+import struct
+import argparse
+
+import headless
+from headless import game
+
+# seed, world, level, platforms generated, platforms kept by the bounds filter, solid platforms kept, exit status
+RECORD = struct.Struct("<IBBHHHB")
+EXIT_UNREACHABLE, EXIT_REACHABLE, NO_EXIT = 0, 1, 2
+
+def level_kinds():
+    """Every distinct (world theme, level, is_boss) the overworld can generate"""
+    return sorted({(node["theme"], game.node_level_num(node), node["is_boss"]) for node in game.overworld_nodes})
+
+def sweep_chunk(task):
+    world, level, is_boss, first_seed, count = task
+    rng = random.Random()
+    records = bytearray(RECORD.size * count)
+    for i in range(count):
+        seed = first_seed + i
+        rng.seed(seed)
+        generated = game.layout_platforms(world, level, is_boss, rng)
+        kept = [p for p in generated if game.platform_in_bounds(p)]
+        solid = sum(1 for p in kept if not game.is_hazard(p))
+        exit_status = NO_EXIT
+        if not is_boss and kept:
+            exit_rect = game.pygame.Rect(game.exit_position(kept), game.EXIT_SIZE)
+            exit_status = EXIT_REACHABLE if game.analyze_reachability(kept, exit_rect).exit_reachable else EXIT_UNREACHABLE
+        RECORD.pack_into(records, i * RECORD.size, seed, world, level, len(generated), len(kept), solid, exit_status)
+    return (bytes(records),)
+
+def summarize(stats, records):
+    for seed, world, level, generated, kept, solid, exit_status in RECORD.iter_unpack(records):
+        entry = stats.setdefault(f"W{world}-L{level}", {"layouts": 0, "min_platforms": kept, "max_platforms": kept, "platforms": 0, "rejected": 0, "empty": 0, "empty_seeds": [], "unreachable_exits": 0, "unreachable_seeds": []})
+        entry["layouts"] += 1
+        entry["min_platforms"] = min(entry["min_platforms"], kept)
+        entry["max_platforms"] = max(entry["max_platforms"], kept)
+        entry["platforms"] += kept
+        entry["rejected"] += generated - kept
+        if solid == 0:
+            entry["empty"] += 1
+            if len(entry["empty_seeds"]) < 10:
+                entry["empty_seeds"].append(seed)
+        if exit_status == EXIT_UNREACHABLE:
+            entry["unreachable_exits"] += 1
+            if len(entry["unreachable_seeds"]) < 10:
+                entry["unreachable_seeds"].append(seed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and check procedural layouts for many seeds across a process pool")
+    parser.add_argument("--seeds", type=int, default=10000, help="seeds per world/level")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--chunk", type=int, default=2000, help="seeds per worker task")
+    headless.add_pool_arguments(parser, "sweep.bin", RECORD, "layout")
+    args = parser.parse_args()
+
+    tasks = [(world, level, is_boss, first_seed, count) for world, level, is_boss in level_kinds()
+             for first_seed, count in headless.chunks(args.first_seed, args.seeds, args.chunk)]
+    stats = {}
+    elapsed = headless.run_pool(sweep_chunk, tasks, args.workers, [args.out], lambda records: summarize(stats, records))
+
+    for entry in stats.values():
+        entry["mean_platforms"] = round(entry.pop("platforms") / entry["layouts"], 3)
+    layouts = sum(entry["layouts"] for entry in stats.values())
+    summary = {"layouts": layouts, "seconds": round(elapsed, 3), "levels": stats}
+    headless.report(summary, args.summary, f"{layouts} layouts in {elapsed:.2f}s ({layouts / elapsed:.0f}/s)")
+
+if __name__ == "__main__":
+    main()
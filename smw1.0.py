@@ -1,10 +1,20 @@
 import pygame
 import asyncio
+import argparse
+import collections
+import os
+import time
 import platform
 import sys
 import math
 import random  # Moved to top since it's used in multiple places
 
+# Headless mode: dummy video driver, no drawing and no frame cap
+HEADLESS = "--headless" in sys.argv or os.environ.get("SMW_HEADLESS") == "1"
+if HEADLESS:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
 # Initialize Pygame
 pygame.init()
 
@@ -29,23 +39,14 @@ LAVA_RED = (255, 69, 0)
 STATE_OVERWORLD = "overworld"
 STATE_LEVEL = "level"
 STATE_BOSS = "boss"
-game_state = STATE_OVERWORLD
-current_level = None
-current_world = 1
+STATE_TRANSITION = "transition"
 
 # Player settings
 PLAYER_WIDTH = 40
 PLAYER_HEIGHT = 60
-player_x = 50
-player_y = SCREEN_HEIGHT - PLAYER_HEIGHT - 10
 player_speed = 5
 player_jump = -15
 player_gravity = 0.8
-player_velocity_y = 0
-is_jumping = False
-player_health = 3
-player_lives = 3
-player_score = 0
 
 # Platform settings
 def get_platforms_for_level(world, level):
@@ -79,10 +80,10 @@ def get_platforms_for_level(world, level):
     else:  # Final boss arena
         return [base_ground, pygame.Rect(300, 400, 200, 20), pygame.Rect(100, 200, 600, 20)]
 
-platforms = []
-
 # Enemies and Power-ups
 class Enemy:
+    __slots__ = ("rect", "speed", "direction", "platform")
+
     def __init__(self, x, y, platform):
         self.rect = pygame.Rect(x, y - 20, 30, 30)
         self.speed = 2
@@ -97,25 +98,24 @@ class Enemy:
     def draw(self):
         pygame.draw.circle(screen, RED, self.rect.center, 15)
 
-enemies = []
-
 class PowerUp:
+    __slots__ = ("rect",)
+
     def __init__(self, x, y):
         self.rect = pygame.Rect(x, y, 20, 20)
 
     def draw(self):
         pygame.draw.rect(screen, YELLOW, self.rect)
 
-    def collect(self):
-        global player_health
-        player_health = min(3, player_health + 1)
+    def collect(self, world):
+        world.player_health = min(3, world.player_health + 1)
         return True
 
-power_ups = []
-
 # Boss Classes
 class KamekBoss:
-    def __init__(self, world):
+    __slots__ = ("rect", "health", "speed", "direction", "shoot_timer", "teleport_timer", "projectiles", "rng")
+
+    def __init__(self, world, rng=random):
         self.rect = pygame.Rect(SCREEN_WIDTH // 2, 100, 50, 70)
         self.health = 4 + world
         self.speed = 3
@@ -123,6 +123,7 @@ class KamekBoss:
         self.shoot_timer = 0
         self.teleport_timer = 0
         self.projectiles = []
+        self.rng = rng
 
     def update(self):
         # Fly in sine wave
@@ -140,8 +141,8 @@ class KamekBoss:
         # Teleport
         self.teleport_timer += 1
         if self.teleport_timer > 300:
-            self.rect.x = random.randint(0, SCREEN_WIDTH - 50)
-            self.rect.y = random.randint(50, 200)
+            self.rect.x = self.rng.randint(0, SCREEN_WIDTH - 50)
+            self.rect.y = self.rng.randint(50, 200)
             self.teleport_timer = 0
 
         # Update projectiles
@@ -160,6 +161,8 @@ class KamekBoss:
             pygame.draw.rect(screen, GREEN, proj)
 
 class BabyBowserBoss:
+    __slots__ = ("rect", "health", "phase", "attack_timer", "projectiles", "shockwaves")
+
     def __init__(self):
         self.rect = pygame.Rect(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100, 60, 80)
         self.health = 10
@@ -214,14 +217,11 @@ class BabyBowserBoss:
         for proj in self.projectiles:
             pygame.draw.rect(screen, LAVA_RED, proj)
 
-boss = None
-
 # Level exit
 level_exit = pygame.Rect(SCREEN_WIDTH - 60, SCREEN_HEIGHT - 100, 50, 60)
 
 # Overworld settings
 OVERWORLD_PLAYER_SIZE = 20
-overworld_player_pos = [100, 100]
 overworld_player_speed = 5
 overworld_nodes = []
 
@@ -232,11 +232,11 @@ for world in range(1, 6):
         x = 100 + (node_id % 4) * 150
         y = 100 + (node_id // 4) * 150
         level_name = f"world_{world}_level_{level}"
-        overworld_nodes.append({"id": node_id, "pos": (x, y), "level": level_name, "completed": False, "world": world, "is_boss": level == 4})
+        overworld_nodes.append({"id": node_id, "pos": (x, y), "level": level_name, "world": world, "is_boss": level == 4})
         node_id += 1
 
 # Final boss node
-overworld_nodes.append({"id": node_id, "pos": (600, 600), "level": "final_boss", "completed": False, "world": 6, "is_boss": True})
+overworld_nodes.append({"id": node_id, "pos": (600, 600), "level": "final_boss", "world": 6, "is_boss": True})
 
 overworld_paths = []
 for i in range(len(overworld_nodes) - 1):
@@ -244,10 +244,6 @@ for i in range(len(overworld_nodes) - 1):
         overworld_paths.append((i, i+1))
 overworld_paths.append((19, 20))
 
-current_node = 0
-target_node = None
-move_progress = 0
-
 # Font for text
 font = pygame.font.Font(None, 36)
 small_font = pygame.font.Font(None, 24)
@@ -255,319 +251,385 @@ small_font = pygame.font.Font(None, 24)
 # Game loop variables
 clock = pygame.time.Clock()
 FPS = 60
-running = True
-
-# Victory/Defeat screens
-def draw_victory():
-    screen.fill(GREEN)
-    text = font.render("Level Complete!", True, WHITE)
-    screen.blit(text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2))
-    pygame.display.flip()
-
-def draw_game_over():
-    screen.fill(RED)
-    text = font.render("Game Over", True, WHITE)
-    screen.blit(text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2))
-    pygame.display.flip()
-
-def draw_hud():
-    # Health hearts
-    for i in range(player_health):
-        pygame.draw.circle(screen, RED, (30 + i*40, 30), 15)
-    # Score
-    score_text = small_font.render(f"Score: {player_score}", True, WHITE)
-    screen.blit(score_text, (10, 60))
-    # Lives
-    lives_text = small_font.render(f"Lives: {player_lives}", True, WHITE)
-    screen.blit(lives_text, (10, 90))
-
-def draw_overworld():
-    screen.fill(BLUE)
-    
-    # Draw paths
-    for start_id, end_id in overworld_paths:
-        if overworld_nodes[start_id]["completed"] or start_id == current_node:
-            start_pos = overworld_nodes[start_id]["pos"]
-            end_pos = overworld_nodes[end_id]["pos"]
-            pygame.draw.line(screen, WHITE, start_pos, end_pos, 5)
-    
-    # Draw nodes
-    for node in overworld_nodes:
-        color = GREEN if node["completed"] else RED if node["is_boss"] else GRAY
-        pygame.draw.circle(screen, color, node["pos"], 30)
-        pygame.draw.circle(screen, WHITE, node["pos"], 30, 3)
-        level_text = small_font.render(f"W{node['world']}-L{node['id'] % 4 + 1 if not node['is_boss'] else 'Boss'}", True, WHITE)
-        screen.blit(level_text, (node["pos"][0] - 20, node["pos"][1] - 10))
-    
-    # Draw player
-    pygame.draw.circle(screen, YELLOW, (int(overworld_player_pos[0]), int(overworld_player_pos[1])), OVERWORLD_PLAYER_SIZE)
-    
-    # Instructions
-    instructions = small_font.render("Arrow Keys: Move | Enter: Select | ESC: Quit", True, WHITE)
-    screen.blit(instructions, (10, 10))
-    
-    # Current world
-    world_text = small_font.render(f"World {current_world}", True, WHITE)
-    screen.blit(world_text, (10, 40))
 
-def draw_level():
-    screen.fill(BLUE if current_world < 4 else GRAY if current_world == 4 else WHITE)
-    
-    # Draw platforms
-    for platform in platforms:
-        color = BROWN if current_world != 4 else LAVA_RED if platform.y > SCREEN_HEIGHT - 60 else GRAY
-        pygame.draw.rect(screen, color, platform)
-    
-    # Draw enemies
-    for enemy in enemies:
-        enemy.draw()
-    
-    # Draw power-ups
-    for pu in power_ups:
-        pu.draw()
-    
-    # Draw exit
-    if not overworld_nodes[current_node]["is_boss"]:
-        pygame.draw.rect(screen, GREEN, level_exit)
-        exit_text = small_font.render("EXIT", True, WHITE)
-        screen.blit(exit_text, (level_exit.centerx - 20, level_exit.centery - 10))
-    
-    # Draw player
-    pygame.draw.rect(screen, RED, (player_x, player_y, PLAYER_WIDTH, PLAYER_HEIGHT))
-    
-    # Level name
-    level_text = font.render(f"World {current_world} - Level {current_node % 4 + 1}", True, WHITE)
-    screen.blit(level_text, (10, 10))
-    
-    # Instructions
-    instructions = small_font.render("Arrows: Move | Space: Jump | ESC: Map", True, WHITE)
-    screen.blit(instructions, (10, 50))
-    
-    draw_hud()
-
-def draw_boss():
-    draw_level()
-    boss.draw()
-    # Boss health bar
-    pygame.draw.rect(screen, RED, (SCREEN_WIDTH // 2 - 100, 20, 200, 20))
-    health_width = (boss.health / (9 if isinstance(boss, KamekBoss) else 10)) * 200
-    pygame.draw.rect(screen, GREEN, (SCREEN_WIDTH // 2 - 100, 20, health_width, 20))
-
-def handle_overworld_input(keys):
-    global current_node, target_node, move_progress, game_state, current_level, platforms, player_x, player_y, player_velocity_y, current_world, boss, enemies, power_ups
-    
-    if target_node is None:
-        connected_nodes = [end for start, end in overworld_paths if start == current_node] + [start for start, end in overworld_paths if end == current_node]
+class GameWorld:
+    """One game session with its own player, level, enemies, boss and map progress, so several can run in one process"""
+    __slots__ = ("rng", "running", "game_state", "current_level", "current_world",
+                 "player_x", "player_y", "player_velocity_y", "is_jumping", "player_health", "player_lives", "player_score",
+                 "platforms", "enemies", "power_ups", "boss",
+                 "completed", "current_node", "target_node", "move_progress", "overworld_player_pos",
+                 "transition_screen", "transition_ticks", "transition_next")
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.running = True
+        self.game_state = STATE_OVERWORLD
+        self.current_level = None
+        self.current_world = 1
+
+        self.player_x = 50
+        self.player_y = SCREEN_HEIGHT - PLAYER_HEIGHT - 10
+        self.player_velocity_y = 0
+        self.is_jumping = False
+        self.player_health = 3
+        self.player_lives = 3
+        self.player_score = 0
+
+        self.platforms = []
+        self.enemies = []
+        self.power_ups = []
+        self.boss = None
+
+        self.completed = bytearray(len(overworld_nodes))
+        self.current_node = 0
+        self.target_node = None
+        self.move_progress = 0
+        self.overworld_player_pos = list(overworld_nodes[0]["pos"])
+
+        # Victory/Defeat screens are timed states counted down by step(), so the loop keeps handling events meanwhile
+        self.transition_screen = None
+        self.transition_ticks = 0
+        self.transition_next = STATE_OVERWORLD
+
+    def start_transition(self, message, color, ms, next_state=STATE_OVERWORLD):
+        """Show message for ms of game time, then switch to next_state (None ends the game)"""
+        self.game_state = STATE_TRANSITION
+        self.transition_screen = (message, color)
+        self.transition_ticks = ms * FPS // 1000
+        self.transition_next = next_state
+
+    def show_victory(self, ms, next_state=STATE_OVERWORLD):
+        self.start_transition("Level Complete!", GREEN, ms, next_state)
+
+    def show_game_over(self):
+        self.start_transition("Game Over", RED, 2000)
+
+    def update_transition(self):
+        self.transition_ticks -= 1
+        if self.transition_ticks <= 0:
+            if self.transition_next is None:
+                self.running = False
+            else:
+                self.game_state = self.transition_next
+
+    def draw_transition(self):
+        message, color = self.transition_screen
+        screen.fill(color)
+        text = font.render(message, True, WHITE)
+        screen.blit(text, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2))
+
+    def draw_hud(self):
+        # Health hearts
+        for i in range(self.player_health):
+            pygame.draw.circle(screen, RED, (30 + i*40, 30), 15)
+        # Score
+        score_text = small_font.render(f"Score: {self.player_score}", True, WHITE)
+        screen.blit(score_text, (10, 60))
+        # Lives
+        lives_text = small_font.render(f"Lives: {self.player_lives}", True, WHITE)
+        screen.blit(lives_text, (10, 90))
+
+    def draw_overworld(self):
+        screen.fill(BLUE)
         
-        if keys[pygame.K_RIGHT]:
-            # Find next node to the right
-            for node_id in connected_nodes:
-                if node_id > current_node:
-                    target_node = node_id
-                    move_progress = 0
-                    break
+        # Draw paths
+        for start_id, end_id in overworld_paths:
+            if self.completed[start_id] or start_id == self.current_node:
+                start_pos = overworld_nodes[start_id]["pos"]
+                end_pos = overworld_nodes[end_id]["pos"]
+                pygame.draw.line(screen, WHITE, start_pos, end_pos, 5)
         
-        if keys[pygame.K_RETURN]:
-            node = overworld_nodes[current_node]
-            current_world = node["world"]
-            if node["is_boss"]:
-                game_state = STATE_BOSS
-                if node["level"] == "final_boss":
-                    boss = BabyBowserBoss()
-                else:
-                    boss = KamekBoss(current_world)
-            else:
-                game_state = STATE_LEVEL
-            current_level = node["level"]
-            level_num = current_node % 4 + 1 if current_node < 20 else 4
-            platforms = get_platforms_for_level(current_world, level_num)
+        # Draw nodes
+        for node in overworld_nodes:
+            color = GREEN if self.completed[node["id"]] else RED if node["is_boss"] else GRAY
+            pygame.draw.circle(screen, color, node["pos"], 30)
+            pygame.draw.circle(screen, WHITE, node["pos"], 30, 3)
+            level_text = small_font.render(f"W{node['world']}-L{node['id'] % 4 + 1 if not node['is_boss'] else 'Boss'}", True, WHITE)
+            screen.blit(level_text, (node["pos"][0] - 20, node["pos"][1] - 10))
+        
+        # Draw player
+        pygame.draw.circle(screen, YELLOW, (int(self.overworld_player_pos[0]), int(self.overworld_player_pos[1])), OVERWORLD_PLAYER_SIZE)
+        
+        # Instructions
+        instructions = small_font.render("Arrow Keys: Move | Enter: Select | ESC: Quit", True, WHITE)
+        screen.blit(instructions, (10, 10))
+        
+        # Current world
+        world_text = small_font.render(f"World {self.current_world}", True, WHITE)
+        screen.blit(world_text, (10, 40))
+
+    def draw_level(self):
+        current_world = self.current_world
+        screen.fill(BLUE if current_world < 4 else GRAY if current_world == 4 else WHITE)
+        
+        # Draw platforms
+        for platform in self.platforms:
+            color = BROWN if current_world != 4 else LAVA_RED if platform.y > SCREEN_HEIGHT - 60 else GRAY
+            pygame.draw.rect(screen, color, platform)
+        
+        # Draw enemies
+        for enemy in self.enemies:
+            enemy.draw()
+        
+        # Draw power-ups
+        for pu in self.power_ups:
+            pu.draw()
+        
+        # Draw exit
+        if not overworld_nodes[self.current_node]["is_boss"]:
+            pygame.draw.rect(screen, GREEN, level_exit)
+            exit_text = small_font.render("EXIT", True, WHITE)
+            screen.blit(exit_text, (level_exit.centerx - 20, level_exit.centery - 10))
+        
+        # Draw player
+        pygame.draw.rect(screen, RED, (self.player_x, self.player_y, PLAYER_WIDTH, PLAYER_HEIGHT))
+        
+        # Level name
+        level_text = font.render(f"World {current_world} - Level {self.current_node % 4 + 1}", True, WHITE)
+        screen.blit(level_text, (10, 10))
+        
+        # Instructions
+        instructions = small_font.render("Arrows: Move | Space: Jump | ESC: Map", True, WHITE)
+        screen.blit(instructions, (10, 50))
+        
+        self.draw_hud()
+
+    def draw_boss(self):
+        boss = self.boss
+        self.draw_level()
+        boss.draw()
+        # Boss health bar
+        pygame.draw.rect(screen, RED, (SCREEN_WIDTH // 2 - 100, 20, 200, 20))
+        health_width = (boss.health / (9 if isinstance(boss, KamekBoss) else 10)) * 200
+        pygame.draw.rect(screen, GREEN, (SCREEN_WIDTH // 2 - 100, 20, health_width, 20))
+
+    def draw(self):
+        if self.game_state == STATE_OVERWORLD:
+            self.draw_overworld()
+        elif self.game_state == STATE_LEVEL:
+            self.draw_level()
+        elif self.game_state == STATE_BOSS:
+            self.draw_boss()
+        elif self.game_state == STATE_TRANSITION:
+            self.draw_transition()
+
+    def handle_overworld_input(self, keys):
+        if self.target_node is None:
+            current_node = self.current_node
+            connected_nodes = [end for start, end in overworld_paths if start == current_node] + [start for start, end in overworld_paths if end == current_node]
             
-            # Reset player position
-            player_x = 50
-            player_y = SCREEN_HEIGHT - PLAYER_HEIGHT - 50
-            player_velocity_y = 0
+            if keys[pygame.K_RIGHT]:
+                # Find next node to the right
+                for node_id in connected_nodes:
+                    if node_id > current_node:
+                        self.target_node = node_id
+                        self.move_progress = 0
+                        break
             
-            # Spawn enemies and power-ups
-            enemies.clear()
-            power_ups.clear()
-            if len(platforms) > 1:
-                for i in range(min(current_world + level_num, 5)):
-                    enemies.append(Enemy(200 + i*100, platforms[1].top, platforms[1]))
-                power_ups.append(PowerUp(400, 300))
-
-    if target_node is not None:
-        move_progress += 0.02
-        if move_progress >= 1:
-            current_node = target_node
-            overworld_player_pos[0], overworld_player_pos[1] = overworld_nodes[current_node]["pos"]
-            target_node = None
-        else:
-            start = overworld_nodes[current_node]["pos"]
-            end = overworld_nodes[target_node]["pos"]
-            overworld_player_pos[0] = start[0] + (end[0] - start[0]) * move_progress
-            overworld_player_pos[1] = start[1] + (end[1] - start[1]) * move_progress
-
-def handle_level_input(keys):
-    global player_x, player_y, player_velocity_y, is_jumping, game_state
-    
-    if keys[pygame.K_LEFT]:
-        player_x -= player_speed
-        player_x = max(0, player_x)
-    if keys[pygame.K_RIGHT]:
-        player_x += player_speed
-        player_x = min(SCREEN_WIDTH - PLAYER_WIDTH, player_x)
-    if keys[pygame.K_SPACE] and not is_jumping:
-        player_velocity_y = player_jump
-        is_jumping = True
-    if keys[pygame.K_ESCAPE]:
-        game_state = STATE_OVERWORLD
-
-def update_physics():
-    global player_y, player_velocity_y, is_jumping, game_state, player_health, player_lives, player_score
-    
-    player_velocity_y += player_gravity
-    player_y += player_velocity_y
-    player_rect = pygame.Rect(player_x, player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
-    
-    is_jumping = True
-    for platform in platforms:
-        if player_rect.colliderect(platform) and player_velocity_y > 0 and player_rect.bottom <= platform.top + 10:
-            player_y = platform.top - PLAYER_HEIGHT
-            player_velocity_y = 0
-            is_jumping = False
-    
-    # Enemy collisions
-    for enemy in enemies[:]:
-        if player_rect.colliderect(enemy.rect):
-            if player_velocity_y > 0 and player_rect.bottom < enemy.rect.centery:
-                enemies.remove(enemy)
-                player_score += 100
-            else:
-                player_health -= 1
-                if player_health <= 0:
-                    player_lives -= 1
-                    if player_lives <= 0:
-                        game_state = STATE_OVERWORLD
-                        draw_game_over()
-                        pygame.time.wait(2000)
+            if keys[pygame.K_RETURN]:
+                node = overworld_nodes[current_node]
+                self.current_world = node["world"]
+                if node["is_boss"]:
+                    self.game_state = STATE_BOSS
+                    if node["level"] == "final_boss":
+                        self.boss = BabyBowserBoss()
                     else:
-                        player_health = 3
-                        player_x, player_y = 50, SCREEN_HEIGHT - PLAYER_HEIGHT - 50
-    
-    # Power-up collect
-    for pu in power_ups[:]:
-        if player_rect.colliderect(pu.rect):
-            if pu.collect():
-                power_ups.remove(pu)
-                player_score += 50
-    
-    # Fall off screen
-    if player_y > SCREEN_HEIGHT:
-        player_health -= 1
-        if player_health <= 0:
-            player_lives -= 1
-            if player_lives <= 0:
-                game_state = STATE_OVERWORLD
-                draw_game_over()
-                pygame.time.wait(2000)
+                        self.boss = KamekBoss(self.current_world, self.rng)
+                else:
+                    self.game_state = STATE_LEVEL
+                self.current_level = node["level"]
+                level_num = current_node % 4 + 1 if current_node < 20 else 4
+                self.platforms = platforms = get_platforms_for_level(self.current_world, level_num)
+                
+                # Reset player position
+                self.player_x = 50
+                self.player_y = SCREEN_HEIGHT - PLAYER_HEIGHT - 50
+                self.player_velocity_y = 0
+                
+                # Spawn enemies and power-ups
+                self.enemies.clear()
+                self.power_ups.clear()
+                if len(platforms) > 1:
+                    for i in range(min(self.current_world + level_num, 5)):
+                        self.enemies.append(Enemy(200 + i*100, platforms[1].top, platforms[1]))
+                    self.power_ups.append(PowerUp(400, 300))
+
+        if self.target_node is not None:
+            self.move_progress += 0.02
+            if self.move_progress >= 1:
+                self.current_node = self.target_node
+                self.overworld_player_pos[0], self.overworld_player_pos[1] = overworld_nodes[self.current_node]["pos"]
+                self.target_node = None
             else:
-                player_health = 3
-        player_x, player_y = 50, SCREEN_HEIGHT - PLAYER_HEIGHT - 50
-    
-    # Exit check
-    if not overworld_nodes[current_node]["is_boss"] and player_rect.colliderect(level_exit):
-        overworld_nodes[current_node]["completed"] = True
-        if (current_node + 1) % 4 == 0:
-            current_world += 1
-        game_state = STATE_OVERWORLD
-        draw_victory()
-        pygame.time.wait(1000)
-
-def update_boss():
-    global game_state, boss, player_health, player_lives
-    
-    boss.update()
-    player_rect = pygame.Rect(player_x, player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
-    
-    # Player attacks boss
-    if player_rect.colliderect(boss.rect) and player_velocity_y > 0 and player_rect.bottom < boss.rect.centery:
-        if boss.take_damage():
-            overworld_nodes[current_node]["completed"] = True
-            if current_node == 20:
-                # Game win
-                draw_victory()
-                pygame.display.flip()
-                pygame.time.wait(3000)
-                global running
-                running = False
-                return
-            game_state = STATE_OVERWORLD
-            draw_victory()
-            pygame.display.flip()
-            pygame.time.wait(2000)
-        player_velocity_y = player_jump / 2
-    
-    # Boss attacks player
-    for proj in boss.projectiles[:]:
-        if player_rect.colliderect(proj):
-            player_health -= 1
-            boss.projectiles.remove(proj)
-    
-    if isinstance(boss, BabyBowserBoss):
-        for wave in boss.shockwaves[:]:
-            if player_rect.colliderect(wave):
-                player_health -= 1
-                boss.shockwaves.remove(wave)
-    
-    if player_health <= 0:
-        player_lives -= 1
-        if player_lives <= 0:
-            game_state = STATE_OVERWORLD
-            draw_game_over()
-            pygame.time.wait(2000)
-        else:
-            player_health = 3
-            player_x, player_y = 50, SCREEN_HEIGHT - PLAYER_HEIGHT - 50
+                start = overworld_nodes[self.current_node]["pos"]
+                end = overworld_nodes[self.target_node]["pos"]
+                self.overworld_player_pos[0] = start[0] + (end[0] - start[0]) * self.move_progress
+                self.overworld_player_pos[1] = start[1] + (end[1] - start[1]) * self.move_progress
+
+    def handle_level_input(self, keys):
+        if keys[pygame.K_LEFT]:
+            self.player_x = max(0, self.player_x - player_speed)
+        if keys[pygame.K_RIGHT]:
+            self.player_x = min(SCREEN_WIDTH - PLAYER_WIDTH, self.player_x + player_speed)
+        if keys[pygame.K_SPACE] and not self.is_jumping:
+            self.player_velocity_y = player_jump
+            self.is_jumping = True
+        if keys[pygame.K_ESCAPE]:
+            self.game_state = STATE_OVERWORLD
+
+    def update_physics(self):
+        self.player_velocity_y += player_gravity
+        self.player_y += self.player_velocity_y
+        player_rect = pygame.Rect(self.player_x, self.player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
+        
+        self.is_jumping = True
+        for platform in self.platforms:
+            if player_rect.colliderect(platform) and self.player_velocity_y > 0 and player_rect.bottom <= platform.top + 10:
+                self.player_y = platform.top - PLAYER_HEIGHT
+                self.player_velocity_y = 0
+                self.is_jumping = False
+        
+        # Enemy collisions
+        for enemy in self.enemies[:]:
+            if player_rect.colliderect(enemy.rect):
+                if self.player_velocity_y > 0 and player_rect.bottom < enemy.rect.centery:
+                    self.enemies.remove(enemy)
+                    self.player_score += 100
+                else:
+                    self.player_health -= 1
+                    if self.player_health <= 0:
+                        self.player_lives -= 1
+                        if self.player_lives <= 0:
+                            self.show_game_over()
+                        else:
+                            self.player_health = 3
+                            self.player_x, self.player_y = 50, SCREEN_HEIGHT - PLAYER_HEIGHT - 50
+        
+        # Power-up collect
+        for pu in self.power_ups[:]:
+            if player_rect.colliderect(pu.rect):
+                if pu.collect(self):
+                    self.power_ups.remove(pu)
+                    self.player_score += 50
+        
+        # Fall off screen
+        if self.player_y > SCREEN_HEIGHT:
+            self.player_health -= 1
+            if self.player_health <= 0:
+                self.player_lives -= 1
+                if self.player_lives <= 0:
+                    self.show_game_over()
+                else:
+                    self.player_health = 3
+            self.player_x, self.player_y = 50, SCREEN_HEIGHT - PLAYER_HEIGHT - 50
+        
+        # Exit check
+        if not overworld_nodes[self.current_node]["is_boss"] and player_rect.colliderect(level_exit):
+            self.completed[self.current_node] = 1
+            if (self.current_node + 1) % 4 == 0:
+                self.current_world += 1
+            self.show_victory(1000)
+
+    def update_boss(self):
+        boss = self.boss
+        boss.update()
+        player_rect = pygame.Rect(self.player_x, self.player_y, PLAYER_WIDTH, PLAYER_HEIGHT)
+        
+        # Player attacks boss
+        if player_rect.colliderect(boss.rect) and self.player_velocity_y > 0 and player_rect.bottom < boss.rect.centery:
+            if boss.take_damage():
+                self.completed[self.current_node] = 1
+                if self.current_node == 20:
+                    # Game win
+                    self.show_victory(3000, None)
+                    return
+                self.show_victory(2000)
+            self.player_velocity_y = player_jump / 2
+        
+        # Boss attacks player
+        for proj in boss.projectiles[:]:
+            if player_rect.colliderect(proj):
+                self.player_health -= 1
+                boss.projectiles.remove(proj)
+        
+        if isinstance(boss, BabyBowserBoss):
+            for wave in boss.shockwaves[:]:
+                if player_rect.colliderect(wave):
+                    self.player_health -= 1
+                    boss.shockwaves.remove(wave)
+        
+        if self.player_health <= 0:
+            self.player_lives -= 1
+            if self.player_lives <= 0:
+                self.show_game_over()
+            else:
+                self.player_health = 3
+                self.player_x, self.player_y = 50, SCREEN_HEIGHT - PLAYER_HEIGHT - 50
+
+    def step(self, keys):
+        """Advance the game by one frame on a key mapping"""
+        if self.game_state == STATE_OVERWORLD:
+            self.handle_overworld_input(keys)
+        elif self.game_state == STATE_LEVEL:
+            self.handle_level_input(keys)
+            self.update_physics()
+            for enemy in self.enemies:
+                enemy.update()
+        elif self.game_state == STATE_BOSS:
+            self.handle_level_input(keys)
+            self.update_physics()
+            self.update_boss()
+        elif self.game_state == STATE_TRANSITION:
+            self.update_transition()
+
+def autoplay_keys(world, frame):
+    """Key state for headless runs: enter every level, run right and hop"""
+    keys = collections.defaultdict(bool)
+    if world.game_state == STATE_OVERWORLD:
+        keys[pygame.K_RETURN] = True
+    else:
+        keys[pygame.K_RIGHT] = True
+        keys[pygame.K_SPACE] = frame % 45 == 0
+    return keys
 
 # Main game loop
-async def main():
-    global running, game_state, boss, overworld_player_pos
+async def main(world, headless=HEADLESS, max_frames=None):
+    frame = 0
+    start_time = time.perf_counter()
     
-    # Initialize overworld player position
-    overworld_player_pos = list(overworld_nodes[current_node]["pos"])
-    
-    while running:
+    while world.running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                running = False
+                world.running = False
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE and game_state == STATE_OVERWORLD:
-                    running = False
+                if event.key == pygame.K_ESCAPE and world.game_state == STATE_OVERWORLD:
+                    world.running = False
         
-        keys = pygame.key.get_pressed()
+        world.step(autoplay_keys(world, frame) if headless else pygame.key.get_pressed())
+        if not headless:
+            world.draw()
         
-        if game_state == STATE_OVERWORLD:
-            handle_overworld_input(keys)
-            draw_overworld()
-        elif game_state == STATE_LEVEL:
-            handle_level_input(keys)
-            update_physics()
-            for enemy in enemies:
-                enemy.update()
-            draw_level()
-        elif game_state == STATE_BOSS:
-            handle_level_input(keys)
-            update_physics()
-            update_boss()
-            if running:  # Only draw if game is still running
-                draw_boss()
+        frame += 1
+        if max_frames is not None and frame >= max_frames:
+            world.running = False
         
-        pygame.display.flip()
-        clock.tick(FPS)
+        if not headless:
+            pygame.display.flip()
+            clock.tick(FPS)
         await asyncio.sleep(0)
     
+    if headless:
+        elapsed = time.perf_counter() - start_time
+        print(f"Simulated {frame} frames in {elapsed:.2f}s: {frame / elapsed:.0f} FPS, {frame / FPS / elapsed:.0f}x real time")
+    
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless", action="store_true", help="dummy video driver, no drawing, run uncapped")
+    parser.add_argument("--frames", type=int, help="stop after this many frames (headless default: one hour of gameplay)")
+    args = parser.parse_args()
+    if HEADLESS and args.frames is None:
+        args.frames = FPS * 60 * 60
+    asyncio.run(main(GameWorld(), max_frames=args.frames))
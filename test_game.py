@@ -0,0 +1,175 @@
+import random
+
+import pytest
+
+from headless import game
+import rollout_farm
+
+WALKING_NODES = [node["id"] for node in game.overworld_nodes if not node["is_boss"]]
+BOSS_NODES = [node["id"] for node in game.overworld_nodes if node["is_boss"]]
+
+def clears(node_id, masks, ticks=1200):
+    """Whether holding each mask in turn, for 8 ticks at a time, clears node_id from a fresh world"""
+    world = game.GameWorld(0)
+    world.enter_node(node_id)
+    for tick in range(ticks):
+        if world.game_state not in (game.STATE_LEVEL, game.STATE_BOSS):
+            break
+        world.step(masks[tick // 8 % len(masks)])
+    return bool(world.completed[node_id])
+
+def test_reachability_agrees_with_play():
+    # Jump-heavy input: a jump on the very first tick, held runs and the rollout farm's random policy
+    scripted = [[2 | 4], [1 | 4], [2 | 4, 2, 2], [4, 2 | 4, 1 | 4]]
+    for node_id in WALKING_NODES:
+        node = game.overworld_nodes[node_id]
+        cleared = any(clears(node_id, masks) for masks in scripted)
+        for index in range(8):
+            record = rollout_farm.play_episode(node_id, rollout_farm.episode_seed(node, index), 1200)
+            cleared = cleared or rollout_farm.EPISODE.unpack(record)[3] == rollout_farm.CLEARED
+        if game.level_for_node(node).exit_reachable is False:
+            assert not cleared, f"{node['level']} was cleared but its exit is reported unreachable"
+
+def clears_alone(layout, screen_index):
+    """Whether one screen of a long stage, moved back to the origin, reaches its own exit"""
+    platforms = [p.move(-screen_index * game.SCREEN_WIDTH, 0) for p in layout]
+    return game.analyze_reachability(platforms, game.pygame.Rect(game.exit_position(platforms), game.EXIT_SIZE)).exit_reachable
+
+@pytest.mark.parametrize("screens", [2, 3, 5])
+def test_long_stages_bridge_every_screen(screens):
+    for node_id in WALKING_NODES:
+        node = game.overworld_nodes[node_id]
+        layouts = game.screen_layouts(node["theme"], game.node_level_num(node), node["level"], False, random.Random(), screens)
+        if all(clears_alone(layout, index) for index, layout in enumerate(layouts)):
+            assert game.level_for_node(node, screens).exit_reachable, f"{node['level']} breaks at a screen boundary"
+
+def test_batch_env_matches_game_world():
+    batch_env = pytest.importorskip("batch_env")
+    for node_id, level_screens in ((0, 1), (4, 1), (9, 1), (12, 1), (1, 2)):
+        assert batch_env.validate(node_id, envs=16, ticks=300, seed=node_id, level_screens=level_screens) is None
+
+def play(world, first, ticks):
+    for frame in range(first, first + ticks):
+        world.step(game.autoplay_keys(world, frame))
+
+@pytest.mark.parametrize("vector_enemies", [False, True])
+@pytest.mark.parametrize("start", ["overworld", "level", "long_level", "kamek", "baby_bowser", "endless"])
+def test_restored_snapshot_plays_on_identically(start, vector_enemies):
+    if vector_enemies:
+        pytest.importorskip("numpy")
+    world = game.GameWorld(7, vector_enemies, 3 if start == "long_level" else 1)
+    if start in ("level", "long_level"):
+        world.enter_node(WALKING_NODES[2])
+    elif start == "kamek":
+        world.enter_node(BOSS_NODES[0])
+    elif start == "baby_bowser":
+        world.enter_node(BOSS_NODES[-1])
+    elif start == "endless":
+        world.start_endless(2)
+    play(world, 0, 200)
+    data = world.snapshot()
+    restored = game.GameWorld(99).restore(data)
+    assert restored.snapshot() == data
+    for frame in range(200, 500):
+        keys = game.autoplay_keys(world, frame)
+        world.step(keys)
+        restored.step(keys)
+        assert restored.snapshot() == world.snapshot(), f"diverged at tick {frame}"
+
+def test_restore_rejects_other_versions():
+    data = bytearray(game.GameWorld(0).snapshot())
+    data[4] += 1
+    with pytest.raises(ValueError):
+        game.GameWorld(0).restore(bytes(data))
+
+def test_snapshot_fits_large_maps():
+    world = game.GameWorld(worlds=9000)
+    world.target_node = 32768
+    data = world.snapshot()
+    assert game.GameWorld(worlds=9000).restore(data).target_node == 32768
+    with pytest.raises(ValueError):
+        game.GameWorld(worlds=17000)
+
+@pytest.mark.parametrize("frames", [30, 90])
+def test_rewind_keeps_the_last_frames(frames):
+    world = game.GameWorld(1)
+    world.enter_node(WALKING_NODES[1])
+    rewind = game.RewindBuffer(frames)
+    for frame in range(frames * 5):
+        world.step(game.autoplay_keys(world, frame))
+        rewind.push(world.snapshot())
+        if frame >= frames:
+            assert len(rewind) >= frames - 1
+
+@pytest.mark.parametrize("budget", [game.REWIND_BUDGET, 20000, 6000])
+def test_rewind_matches_history(budget):
+    world = game.GameWorld(5)
+    world.start_endless(1)
+    rewind = game.RewindBuffer(200, budget)
+    history = [world.snapshot()]
+    rewind.push(history[-1])
+    choices = random.Random(budget)
+    frame = 0
+    for _ in range(1500):
+        if choices.random() < 0.02:
+            for _ in range(min(choices.randrange(1, 60), len(rewind) - 1)):
+                history.pop()
+                assert rewind.rewind() == history[-1]
+            world.restore(history[-1])
+        else:
+            world.step(game.autoplay_keys(world, frame))
+            frame += 1
+            history.append(world.snapshot())
+            rewind.push(history[-1])
+        kept = len(rewind)
+        for index in (0, kept // 2, kept - 1):
+            assert rewind.frame(index) == history[len(history) - kept + index]
+
+def record(path, ticks, level_screens=1, endless=0, worlds=5, vector_enemies=False):
+    """Autoplay a fresh world for ticks while recording it to path; returns the world"""
+    world = game.GameWorld(3, vector_enemies, level_screens, worlds)
+    if endless:
+        world.start_endless(endless)
+    recorder = game.InputRecorder(str(path), 3, level_screens, endless, worlds, vector_enemies)
+    for frame in range(ticks):
+        keys = game.autoplay_keys(world, frame)
+        recorder.record(keys)
+        world.step(keys)
+    recorder.save()
+    return world
+
+def test_benchmark_replays_endless_runs(tmp_path):
+    benchmark = pytest.importorskip("benchmark")
+    # Long enough to stream chunks past the ones loaded at the start
+    recorded = record(tmp_path / "endless.rec", 600, endless=4)
+    assert recorded.endless.chunks[0].index > 0
+    timer = benchmark.PhaseTimer(game.pygame, game.GameWorld)
+    try:
+        replayed, samples = benchmark.play_replay(game, timer, game.load_replay(str(tmp_path / "endless.rec")))
+    finally:
+        timer.restore()
+    assert len(samples) == 600
+    assert replayed.snapshot() == recorded.snapshot()
+
+@pytest.mark.parametrize("modes", [{}, {"level_screens": 3}, {"endless": 4}, {"worlds": 7}, {"vector_enemies": True}])
+def test_replay_reproduces_recording(tmp_path, modes):
+    if modes.get("vector_enemies"):
+        pytest.importorskip("numpy")
+    path = tmp_path / "session.rec"
+    recorded = record(path, 900, **modes)
+    replay = game.load_replay(str(path))
+    assert (replay.level_screens, replay.endless, replay.worlds, replay.vector_enemies) == \
+        (modes.get("level_screens", 1), modes.get("endless", 0), modes.get("worlds", 5), modes.get("vector_enemies", False))
+    world = game.replay_world(replay)
+    for mask in replay.masks:
+        world.step(mask)
+    assert world.snapshot() == recorded.snapshot()
+
+@pytest.mark.parametrize("cut", [1, game.REPLAY_RUN.size, game.REPLAY_HEADER.size + 100000])
+def test_truncated_replay_is_rejected(tmp_path, cut):
+    path = tmp_path / "session.rec"
+    record(path, 300)
+    data = path.read_bytes()
+    path.write_bytes(data[:max(0, len(data) - cut)])
+    with pytest.raises(ValueError):
+        game.load_replay(str(path))